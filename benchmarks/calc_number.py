@@ -0,0 +1,69 @@
+"""Per operation cost of calc's Number type, compared to the old one that re-wrapped its methods
+
+Run from the repo root with `python -m benchmarks.calc_number`"""
+import decimal
+import functools
+import numbers
+import timeit
+
+from bot.exts.math import CONTEXT, Number
+
+
+class LegacyNumber(decimal.Decimal):
+    """Number as it used to be, wrapping 23 methods on every instantiation"""
+    def __new__(cls, value):
+        def wrap_method(method: str):
+            def wrapped(self, *args, **kwargs):
+                original_method = getattr(super(), method)
+                functools.update_wrapper(wrapped, original_method)
+                res = original_method(*args, **kwargs)
+                if isinstance(res, numbers.Number):
+                    res = cls(res)
+
+                return res
+
+            return wrapped
+
+        to_wrap = [
+            '__add__', '__sub__', '__mul__', '__truediv__', '__floordiv__', '__mod__', '__divmod__',
+            '__pow__', '__radd__', '__rsub__', '__rmul__', '__rtruediv__', '__rfloordiv__', '__rmod__',
+            '__rdivmod__', '__rpow__', '__neg__', '__pos__', '__abs__', '__round__', '__trunc__', '__floor__',
+            '__ceil__'
+        ]
+
+        for method in to_wrap:
+            setattr(cls, method, wrap_method(method))
+
+        return decimal.Decimal.__new__(cls, value)
+
+
+OPERATIONS = {
+    'construct': 'cls("1.5")',
+    'a + b': 'a + b',
+    'a * b': 'a * b',
+    'a / b': 'a / b',
+    'a ** 2': 'a ** two',
+    '-a': '-a',
+    'int + a': '3 + a',
+    'floor(a)': 'math.floor(a)'
+}
+
+
+def bench(cls: type, statement: str, number: int = 10_000) -> float:
+    """Best per-operation time in nanoseconds"""
+    setup = 'import math; a = cls("1.5"); b = cls("7"); two = cls(2)'
+    timer = timeit.Timer(statement, setup, globals={'cls': cls})
+    return min(timer.repeat(3, number)) / number * 1e9
+
+
+def main():
+    decimal.setcontext(CONTEXT.copy())
+    print(f'{"operation":<12} {"legacy":>10} {"current":>10} {"speedup":>8}')
+    for name, statement in OPERATIONS.items():
+        legacy = bench(LegacyNumber, statement)
+        current = bench(Number, statement)
+        print(f'{name:<12} {legacy:>8.0f}ns {current:>8.0f}ns {legacy/current:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Throughput of the 2048 engine, score distributions of simulated games, the odds of spawns and
+how long hints take
+
+Run from the repo root with `python -m benchmarks.game2048`"""
+import math
+import secrets
+import time
+
+import numpy as np
+
+from bot.utils import game2048
+
+SIZES = range(2, 9)
+GAMES = 200
+# Random play on big boards goes on for tens of thousands of moves, games get cut off here
+MAX_MOVES = 2000
+SPAWNS = 110_000
+HINTS = 30
+HINT_TIME = 0.15
+
+
+def simulations(rng: np.random.Generator):
+    print(
+        f'{"size":<5} {"policy":<7} {"moves/s":>10} {"moves":>7} {"ended":>6} '
+        f'{"p10":>7} {"p50":>7} {"p90":>7} {"best":>8} {"top tile":>8}'
+    )
+    for size in SIZES:
+        game2048.engine(size)  # Build tables outside the timing
+        for name, policy in (('random', game2048.random_policy), ('greedy', game2048.greedy_policy)):
+            start = time.perf_counter()
+            scores, moves, tiles = game2048.simulate(size, GAMES, policy, rng, MAX_MOVES)
+            elapsed = time.perf_counter() - start
+
+            ended = np.mean(moves < MAX_MOVES)
+            p10, p50, p90 = np.percentile(scores, [10, 50, 90])
+            values, counts = np.unique(tiles, return_counts=True)
+            print(
+                f'{size:<5} {name:<7} {moves.sum() / elapsed:>10,.0f} {moves.mean():>7.0f} {ended:>6.0%} '
+                f'{p10:>7.0f} {p50:>7.0f} {p90:>7.0f} {scores.max():>8} {values[counts.argmax()]:>8}'
+            )
+
+
+def single_moves(rng: np.random.Generator, number: int = 2000):
+    """What a game in the bot pays per turn, all four moves of one board"""
+    print(f'\n{"size":<5} {"one board":>10} {"batched":>10}')
+    for size in SIZES:
+        engine = game2048.engine(size)
+        boards = rng.integers(0, 8, (number, size, size), dtype=np.uint8)
+        start = time.perf_counter()
+        for board in boards:
+            engine.moves(board)
+        single = (time.perf_counter() - start) / number
+
+        start = time.perf_counter()
+        engine.moves(boards)
+        batched = (time.perf_counter() - start) / number
+        print(f'{size:<5} {single * 1e6:>8.1f}us {batched * 1e6:>8.2f}us')
+
+
+def spawn_odds(name: str, tiles: np.ndarray, cells: np.ndarray, cell_count: int):
+    """How far spawned 4s and spawn cells are from the 1 in 11 and uniform odds they should have"""
+    expected = 1 / 11
+    fours = np.mean(tiles == 2)
+    z = (fours - expected) / math.sqrt(expected * (1 - expected) / len(tiles))
+    counts = np.bincount(cells, minlength=cell_count)
+    chi2 = ((counts - len(cells) / cell_count)**2 / (len(cells) / cell_count)).sum()
+    print(
+        f'{name:<12} 4s: {fours:.4%} (expected {expected:.4%}, z = {z:+.2f}), '
+        f'cells: chi2 = {chi2:.1f} on {cell_count - 1} degrees'
+    )
+
+
+def spawns(rng: np.random.Generator):
+    """Spawn once on empty 4x4 boards, with both the bot's spawn and the simulator's"""
+    print(f'\nSpawn odds over {SPAWNS} spawns, fair odds give a z within ±3 and a chi2 near its degrees')
+    system_random = secrets.SystemRandom()
+    tiles, cells = [], []
+    for _ in range(SPAWNS):
+        board = np.zeros((4, 4), np.uint8)
+        game2048.spawn(board, system_random)
+        cell = np.flatnonzero(board)[0]
+        tiles.append(board.flat[cell])
+        cells.append(cell)
+    spawn_odds('spawn', np.array(tiles), np.array(cells), 16)
+
+    boards = np.zeros((SPAWNS, 4, 4), np.uint8)
+    game2048.spawn_many(boards, rng)
+    flat = boards.reshape(SPAWNS, -1)
+    cells = flat.argmax(axis=1)
+    spawn_odds('spawn_many', flat[np.arange(SPAWNS), cells], cells, 16)
+
+
+def hints(rng: np.random.Generator):
+    """Hints on boards from the middle of greedy games, the bot answers 4x4 ones within 200ms"""
+    print(f'\nHints with {HINT_TIME * 1000:.0f}ms of search past the first move ahead')
+    print(f'{"size":<5} {"p50":>8} {"max":>8} {"depths":>10}')
+    for size in SIZES:
+        searcher = game2048.searcher(size)
+        boards = []
+        for _ in range(HINTS):
+            board = game2048.new_board(size)
+            for _ in range(rng.integers(size * size)):
+                successors, _, legal = searcher.engine.moves(board)
+                if not legal.any():
+                    break
+                board = successors[np.flatnonzero(legal)[0]].copy()
+                game2048.spawn(board)
+            boards.append(board)
+
+        times, depths = [], []
+        for board in boards:
+            searcher.table.entries.clear()  # Every hint starts cold, like the first hint of a game
+            start = time.perf_counter()
+            found = searcher.best_move(board, HINT_TIME)
+            times.append(time.perf_counter() - start)
+            if found is not None:
+                depths.append(found[1])
+        p50, worst = np.percentile(times, 50) * 1000, max(times) * 1000
+        depths = f'{min(depths, default=0)} - {max(depths, default=0)}'
+        print(f'{size:<5} {p50:>6.0f}ms {worst:>6.0f}ms {depths:>10}')
+
+
+def main():
+    rng = np.random.default_rng()
+    simulations(rng)
+    single_moves(rng)
+    spawns(rng)
+    hints(rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,9 @@ import discord
 from discord.ext import commands
 
 from bot import exts
+from bot.utils.compute import ComputePool
+from bot.utils.reactions import ReactionDispatcher
+from bot.utils.triggers import TriggerMatcher
 
 CFG = json.load(open('config_defaults.json')) | json.load(open('config.json'))
 
@@ -22,6 +25,9 @@ class ByterBot(commands.Bot):
         )
 
         self.config = CFG
+        self.compute = ComputePool(**CFG['compute'])
+        self.triggers = TriggerMatcher(CFG['reactions'])
+        self.reactions = ReactionDispatcher()
 
         def _imp_err(name):
             raise ImportError(name=name)
@@ -11,6 +11,7 @@ import discord
 from discord.ext import commands
 
 from bot.utils.formatting import codeblock
+from bot.utils.triggers import TriggerMatcher
 
 
 class Admin(commands.Cog, command_attrs={"hidden": True}):
@@ -132,7 +133,10 @@ class Admin(commands.Cog, command_attrs={"hidden": True}):
 
     @commands.command()
     async def reloadcfg(self, ctx: commands.Context):
-        self.bot.config = json.load(open('config_defaults.json')) | json.load(open('config.json'))
+        config = json.load(open('config_defaults.json')) | json.load(open('config.json'))
+        # Built before swapping anything in, so a broken trigger leaves the old config running
+        triggers = TriggerMatcher(config['reactions'])
+        self.bot.config, self.bot.triggers = config, triggers
         await ctx.message.add_reaction('\N{white heavy check mark}')
 
     @commands.command(aliases=['l'])
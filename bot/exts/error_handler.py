@@ -10,6 +10,8 @@ import fuzzywuzzy.fuzz
 import fuzzywuzzy.process
 from discord.ext import commands, tasks
 
+from bot.utils.compute import ComputeBusy
+
 MESSAGE_UNCAUGHT_ERROR = """An uncaught error occurred while processing your command!
 `{}`
 
@@ -81,6 +83,12 @@ class ErrorHandler(commands.Cog):
             await ctx.send(error)
             return
 
+        elif isinstance(error, ComputeBusy):
+            await ctx.send(
+                embed=discord.Embed(color=0xfafa60, title=':hourglass: Busy!', description=f'{error}')
+            )
+            return
+
         elif hasattr(error, 'original') and isinstance(error.original, discord.Forbidden):
             try:
                 await ctx.send(
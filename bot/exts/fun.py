@@ -1,39 +1,85 @@
 import asyncio
-import re
-import secrets
 
 import aiohttp
 import discord
 import numpy as np
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from bot.utils import game2048
+from bot.utils.compute import ComputeBusy
+from bot.utils.timers import TimerWheel
 
 # left, down, up & right arrows, plus an X
 ARROW_EMOTES = ['\u2b05', '\u2b07', '\u2b06', '\u27a1', '\u274c']
+HINT_EMOTE = '\U0001f4a1'  # A lightbulb
+GAME_EMOTES = [*ARROW_EMOTES, HINT_EMOTE]
+GAME_TIMEOUT = 120
+HINT_TIME = 0.15  # Seconds a hint's search gets on the compute pool, past the first move ahead
+
+
+class Game2048:
+    """A game of 2048 waiting on its player's next move, the message it's on being its key"""
+    def __init__(self, message: discord.Message, player_id: int, size: int, tiles: list):
+        self.message = message
+        self.player_id = player_id
+        self.tiles = tiles
+        self.engine = game2048.engine(size)
+        self.board = np.zeros((size, size), np.uint8)
+        self.score = 0
+        self.move_count = 0
+        self.won = False
+        self.hint = None
+        self.successors = self.scores = self.legal = None
+        self.stale = False  # The message is behind the board
+        self.editing = None
+
+    def next_turn(self) -> bool:
+        """Spawn a tile and work out every move from there, False if none is legal"""
+        game2048.spawn(self.board)
+        self.successors, self.scores, self.legal = self.engine.moves(self.board)
+        return bool(self.legal.any())
+
+    def move(self, direction: int) -> bool:
+        """Make a move if it's legal, picking it from the moves worked out by next_turn"""
+        if not self.legal[direction]:
+            return False
+
+        self.board = self.successors[direction].copy()
+        self.score += int(self.scores[direction])
+        self.move_count += 1
+        self.hint = None
+        return True
+
+    def embed(self, color: int, title: str) -> discord.Embed:
+        tiles = np.minimum(self.board, len(self.tiles) - 1)  # Tiles past the last emoji share it
+        embed = discord.Embed(
+            color=color, title=title, description='\n'.join(''.join(self.tiles[j] for j in i) for i in tiles)
+        ).add_field(name='\u200c', value=f'**Score:** {self.score}\n**Moves:** {self.move_count}')
+        if self.hint is not None:
+            embed.add_field(name='Hint', value=self.hint)
+        return embed
 
 
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.games = {}
+        self.game_timers = TimerWheel()
+        self.expire_games.start()
+
+    def cog_unload(self):
+        self.expire_games.cancel()
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if not message.guild.id == self.bot.config['main_guild_id']:
             return
 
-        for reaction, triggers in self.bot.config['reactions'].items():
-            for trigger in triggers:
-                match = re.search(  # match trigger if it's a word, ignore non-word characters
-                    r'(\s|^){}+(\s|$)'.format(trigger),
-                    re.sub(r'[^\w\s]', '', message.content),
-                    flags=re.IGNORECASE
-                )
-
-                if match:
-                    if reaction.isdecimal():
-                        reaction = self.bot.get_emoji(int(reaction))
-
-                    await message.add_reaction(reaction)
-                    break
+        reactions = self.bot.triggers.match(message.content)
+        if reactions:
+            self.bot.reactions.add(
+                message, *(self.bot.get_emoji(int(i)) if i.isdecimal() else i for i in reactions)
+            )
 
     @commands.command(hidden=True)
     async def ban(self, ctx: commands.Context, *, whom: str):
@@ -56,117 +102,107 @@ class Fun(commands.Cog):
     @commands.cooldown(1, 30)
     @commands.bot_has_permissions(add_reactions=True, manage_messages=True)
     async def _2048(self, ctx: commands.Context, size: int = 4):
-        if not 2 <= size <= 8:
-            raise commands.BadArgument('size must be between 2 and 8')
+        if not 2 <= size <= game2048.MAX_SIZE:
+            raise commands.BadArgument(f'size must be between 2 and {game2048.MAX_SIZE}')
 
-        tiles = self.bot.config['minigame_emoji']['2048']
+        message = await ctx.send(embed=discord.Embed(color=0xfafafa, title='Just a bit...'))
+        game = Game2048(message, ctx.author.id, size, self.bot.config['minigame_emoji']['2048'])
+        if not game.next_turn():  # Only possible on boards too small to move at all
+            await message.edit(embed=game.embed(0xfafa60, 'No moves, game ended!'))
+            return
 
-        def comp(line):
-            """Move cells left. 0 2 0 2 -> 2 2 0 0"""
-            for index, cell, n_cell in zip(range(len(line)), line[:-1], line[1:]):
-                if cell == 0 and n_cell > 0:  # Swap cells if valid and skip to next iteration
-                    line[index:index + 2] = (n_cell, 0)
-                    break
-            else:
-                return line
-            return comp(line)
-
-        def merge_line(line, score):
-            """Merge and move cells left, merging only happens once per cell"""
-            line = comp(line)
-            for index, cell, n_cell in zip(range(len(line)), line[:-1], line[1:]):
-                if cell != 0 and cell == n_cell:
-                    line[index:index + 2] = (cell + 1, 0)
-                    score += 2**(cell + 1)
-            return comp(line), score
-
-        def merge_lines(board, direction, score):
-            """Merge all lines within a board in given direction"""
-            merged = np.rot90(board.copy(), k=direction)
-            for index, line in enumerate(merged):
-                merged[index], score = merge_line(line, score)
-
-            return np.rot90(merged, k=direction * -1), score
-
-        def can_merge(board, direction):
-            """Check if any movement is posible"""
-            return not np.array_equal(board, merge_lines(board, direction, 0)[0])
-
-        game = await ctx.send(embed=discord.Embed(color=0xfafafa, title='Just a bit...'))
-        board = np.zeros((size, size), int)
-        score = 0
-        move_count = 0
-        game_won = False
-        while any(can_merge(board, direction) for direction in range(4)) or not board.any():
-            for emote in ARROW_EMOTES:
-                await game.add_reaction(emote)
-
-            # Find non-zero positions, pick one and set it to either 1 or 2
-            valid_positions = []
-            for x, line in enumerate(board):
-                for y, cell in enumerate(line):
-                    if cell == 0:
-                        valid_positions.append((x, y))
-
-            if valid_positions:
-                board[secrets.choice(valid_positions)] = 1 if secrets.randbelow(11) < 10 else 2
-
-            if not game_won and 11 in board:  # 2^11 -> 2048
-                await ctx.send('You reached 2048! Congratulations!!')
-                game_won = True
-
-            await game.edit(
-                embed=discord.Embed(
-                    color=0x5050fa,
-                    title='2048!',
-                    description='\n'.join(''.join(tiles[j] for j in i) for i in board)
-                ).add_field(name='\u200c', value=f'**Score:** {score}\n**Moves:** {move_count}')
-            )
+        self.games[message.id] = game
+        self.game_timers.schedule(message.id, GAME_TIMEOUT)
+        self.bot.reactions.add(message, *GAME_EMOTES)
+        self.refresh(game)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        game = self.games.get(payload.message_id)
+        emoji = str(payload.emoji)
+        if game is None or payload.user_id != game.player_id or emoji not in GAME_EMOTES:
+            return
+
+        # Nothing gets awaited until the board has moved and its edit is scheduled, so reactions
+        # arriving together each move the board the one before left
+        self.bot.reactions.remove(game.message, payload.emoji, discord.Object(payload.user_id))
+        if emoji == '\u274c':  # An X
+            await self.end_game(game, 'Game ended!')
+            return
+
+        if emoji == HINT_EMOTE:
+            await self.show_hint(game)
+            return
+
+        if not game.move(ARROW_EMOTES.index(emoji)):
+            return
 
+        self.game_timers.schedule(payload.message_id, GAME_TIMEOUT)
+        reached_2048 = not game.won and 11 in game.board  # 2^11 -> 2048
+        game.won |= reached_2048
+        if not game.next_turn():
+            await self.end_game(game, 'No moves, game ended!')
+            return
+
+        self.bot.reactions.add(game.message, *GAME_EMOTES)  # Ones already added are skipped
+        self.refresh(game)
+        if reached_2048:
+            await game.message.channel.send('You reached 2048! Congratulations!!')
+
+    def refresh(self, game: Game2048):
+        """Schedule an edit showing the game as it is, changes made during an edit get the next one"""
+        game.stale = True
+        if game.editing is None or game.editing.done():
+            game.editing = asyncio.ensure_future(self._edit(game))
+
+    async def _edit(self, game: Game2048):
+        while game.stale and self.games.get(game.message.id) is game:
+            game.stale = False
             try:
-                while True:  # Loop checking for reactions until one is a valid move
-                    reaction, _ = await self.bot.wait_for(
-                        'reaction_add',
-                        timeout=120,
-                        check=lambda r, u: u == ctx.author and r.message == game and str(r) in ARROW_EMOTES
-                    )
-
-                    await reaction.remove(ctx.author)
-
-                    if str(reaction.emoji) == '\u274c':  # An X
-                        await game.edit(
-                            embed=discord.Embed(
-                                color=0xfafa60,
-                                title='Game ended!',
-                                description='\n'.join(''.join(tiles[j] for j in i) for i in board)
-                            ).add_field(name='\u200c', value=f'**Score:** {score}\n**Moves:** {move_count}')
-                        )
-                        return
-
-                    if can_merge(board, [0, 3, 1, 2][ARROW_EMOTES.index(str(reaction.emoji))]):
-                        break
-
-            except asyncio.TimeoutError:
-                await game.edit(
-                    embed=discord.Embed(
-                        color=0xfafa60,
-                        title='Timed out, game ended!',
-                        description='\n'.join(''.join(tiles[j] for j in i) for i in board)
-                    ).add_field(name='\u200c', value=f'**Score:** {score}\n**Moves:** {move_count}')
-                )
-                return
-
-            direction = [0, 3, 1, 2][ARROW_EMOTES.index(str(reaction.emoji))]
-            board, score = merge_lines(board, direction, score)
-            move_count += 1
-
-        await game.edit(
-            embed=discord.Embed(
-                color=0xfafa60,
-                title='No moves, game ended!',
-                description='\n'.join(''.join(tiles[j] for j in i) for i in board)
-            ).add_field(name='\u200c', value=f'**Score:** {score}\n**Moves:** {move_count}')
-        )
+                await game.message.edit(embed=game.embed(0x5050fa, '2048!'))
+
+            except discord.HTTPException:
+                pass
+
+    async def show_hint(self, game: Game2048):
+        """Search for the best move on the compute pool and put it on the game's embed"""
+        move_count = game.move_count
+        searcher = game2048.searcher(len(game.board))
+        try:
+            direction, depth = await asyncio.wait_for(
+                self.bot.compute.run(searcher.best_move, game.board.copy(), HINT_TIME), timeout=5
+            )  # Games only wait on boards with a legal move, so there's always one
+
+        except (ComputeBusy, asyncio.TimeoutError):
+            hint = "Couldn't think of one right now, try again in a bit"
+
+        else:
+            hint = f'{ARROW_EMOTES[direction]} (looked {depth} move{"s" * (depth != 1)} ahead)'
+
+        # The player moved or the game ended while the search was going
+        if game.move_count != move_count or self.games.get(game.message.id) is not game:
+            return
+
+        game.hint = hint
+        self.refresh(game)
+
+    async def end_game(self, game: Game2048, title: str):
+        if self.games.pop(game.message.id, None) is None:  # Already ended
+            return
+
+        self.game_timers.cancel(game.message.id)
+        self.bot.reactions.forget(game.message.id)
+        try:
+            await game.message.edit(embed=game.embed(0xfafa60, title))
+
+        except discord.HTTPException:
+            pass
+
+    @tasks.loop(seconds=1)
+    async def expire_games(self):
+        for message_id in self.game_timers.expired():
+            if message_id in self.games:
+                await self.end_game(self.games[message_id], 'Timed out, game ended!')
 
 
 def setup(bot):
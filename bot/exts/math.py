@@ -1,24 +1,31 @@
 import ast
 import asyncio
 import collections.abc
-import concurrent.futures
+import contextvars
 import decimal
+import fractions
 import functools
+import io
 import itertools
 import math
 import numbers
 import operator
 import pprint
+import re
 import textwrap
+import threading
 import time
 import traceback
-from typing import Any, Union
+from typing import Any, Callable, Hashable, Optional, Union
 
 import discord
-from discord.ext import commands
+import numpy as np
+from discord.ext import commands, tasks
 
-from bot.utils.formatting import codeblock
-import sys
+from bot.utils import brainf, plotting, primes, sandbox
+from bot.utils.cache import LRUCache
+from bot.utils.formatting import codeblock, filesize
+from bot.utils.sessions import SessionStore
 
 OPERATORS = {
     # ast.BinOp
@@ -56,32 +63,44 @@ OPERATORS = {
 }
 
 
-class Number(decimal.Decimal):
-    """An decimal object that acts as float / int"""
-    def __new__(cls, value):
-        def wrap_method(method: str):
-            def wrapped(self, *args, **kwargs):
-                original_method = getattr(super(), method)
-                functools.update_wrapper(wrapped, original_method)
-                res = original_method(*args, **kwargs)
-                if isinstance(res, numbers.Number):
-                    res = cls(res)
+CONTEXT = decimal.Context(prec=32, rounding=decimal.ROUND_HALF_EVEN, capitals=0, traps=[])
+MAX_INT_DIGITS = 30_000
+MAX_PRECISION = 1000
+
 
+def _wrap_decimal_methods(*names: str) -> Callable:
+    """Class decorator overriding Decimal methods so they return the class instead of a Decimal
+
+    Methods are wrapped only once here, when the class gets created"""
+    def decorator(cls):
+        def wrap_method(method):
+            @functools.wraps(method)
+            def wrapped(self, *args):
+                res = method(self, *args)
+                if res.__class__ is decimal.Decimal:  # Fast path, skips the isinstance checks
+                    return decimal.Decimal.__new__(cls, res)
+                if isinstance(res, numbers.Number) and not isinstance(res, cls):
+                    return decimal.Decimal.__new__(cls, res)
                 return res
 
             return wrapped
 
-        to_wrap = [
-            '__add__', '__sub__', '__mul__', '__truediv__', '__floordiv__', '__mod__', '__divmod__',
-            '__pow__', '__radd__', '__rsub__', '__rmul__', '__rtruediv__', '__rfloordiv__', '__rmod__',
-            '__rdivmod__', '__rpow__', '__neg__', '__pos__', '__abs__', '__round__', '__trunc__', '__floor__',
-            '__ceil__'
-        ]
+        for name in names:
+            setattr(cls, name, wrap_method(getattr(decimal.Decimal, name)))
+
+        return cls
 
-        for method in to_wrap:
-            setattr(cls, method, wrap_method(method))
+    return decorator
 
-        return decimal.Decimal.__new__(cls, value)
+
+@_wrap_decimal_methods(
+    '__add__', '__sub__', '__mul__', '__truediv__', '__floordiv__', '__mod__', '__divmod__', '__pow__',
+    '__radd__', '__rsub__', '__rmul__', '__rtruediv__', '__rfloordiv__', '__rmod__', '__rdivmod__',
+    '__rpow__', '__neg__', '__pos__', '__abs__', '__round__', '__trunc__', '__floor__', '__ceil__'
+)
+class Number(decimal.Decimal):
+    """An decimal object that acts as float / int"""
+    __slots__ = ()
 
     def __repr__(self):
         return str(self)
@@ -119,8 +138,16 @@ class Number(decimal.Decimal):
     def __index__(self):
         return int(self)
 
+    def __int__(self):
+        # Converting huge decimals to ints takes quadratic time, 1e999999 alone takes over half a minute
+        if self.is_finite() and self.adjusted() > MAX_INT_DIGITS:
+            raise OverflowError(f'number too large to convert to an integer (> 1e{MAX_INT_DIGITS})')
+        return decimal.Decimal.__int__(self)
+
 
 class Boolean(Number):
+    __slots__ = ()
+
     def __new__(cls, value=False):
         return decimal.Decimal.__new__(cls, bool(value))
 
@@ -132,6 +159,8 @@ class Boolean(Number):
 
 
 class Undefined(Number):
+    __slots__ = ()
+
     def __new__(cls, value=False):
         return decimal.Decimal.__new__(cls, 0)
 
@@ -143,6 +172,566 @@ class Undefined(Number):
 
 
 undefined = Undefined()
+TRUE = Boolean(True)
+FALSE = Boolean(False)
+
+
+class LimitExceeded(Exception):
+    """An evaluation went past its budget or got cancelled"""
+
+
+class Budget:
+    """Step and allocation limits for a single evaluation
+
+    Compiled code charges a step for every operation it runs, guarded functions charge for what
+    they iterate over and allocate, user function calls count towards a maximum depth and their
+    memo entries, which live as long as the budget, count as allocations. Cancelling makes the
+    next charge raise, so a timed out evaluation stops instead of keeping its worker thread busy"""
+    def __init__(
+        self,
+        max_steps: int = 5_000_000,
+        max_allocation: int = 1_000_000,
+        max_bits: int = 100_000,
+        max_array_size: int = 10_000_000,
+        max_depth: int = 150,
+        max_memo: int = 100_000
+    ):
+        self.max_steps = max_steps
+        self.max_allocation = max_allocation
+        self.max_bits = max_bits
+        self.max_array_size = max_array_size
+        self.max_depth = max_depth
+        self.max_memo = max_memo
+        self.steps = 0
+        self.allocated = 0
+        self.depth = 0
+        self.memo = {}
+        self.cancelled = False
+
+    def step(self, count: int = 1):
+        self.steps += count
+        if self.steps > self.max_steps or self.cancelled:
+            if self.cancelled:
+                raise LimitExceeded('evaluation was cancelled')
+            raise LimitExceeded(f'went past {self.max_steps} steps')
+
+    def allocate(self, size: int):
+        self.allocated += size
+        if self.allocated > self.max_allocation:
+            raise LimitExceeded(f'allocating {size:.0f} more elements would go past {self.max_allocation}')
+
+    def check_array(self, size: int):
+        self.step(1 + size // 4096)
+        if size > self.max_array_size:
+            raise LimitExceeded(f'array of {size} elements would go past {self.max_array_size}')
+
+    def check_bits(self, bits: float):
+        if bits > self.max_bits:
+            raise LimitExceeded(f'result would take ~{bits:.0f} bits, limit is {self.max_bits}')
+
+    def enter(self):
+        if self.depth >= self.max_depth:
+            raise LimitExceeded(f'went past {self.max_depth} nested calls')
+        self.depth += 1
+
+    def leave(self):
+        self.depth -= 1
+
+    def cancel(self):
+        self.cancelled = True
+
+
+budget = contextvars.ContextVar('budget', default=None)
+
+
+def _bits(value: Any) -> float:
+    """Rough size in bits of a number's integer part"""
+    if isinstance(value, decimal.Decimal):
+        return max(value.adjusted(), 0) * 3.33 + 1 if value.is_finite() and value else 0
+    if isinstance(value, numbers.Rational):
+        return max(abs(value.numerator).bit_length(), value.denominator.bit_length())
+    return 0
+
+
+def _check_pow(running: Budget, base: Any, exponent: Any):
+    # Decimal results are bounded by the context's precision, only exact numbers can blow up, and
+    # negative exponents blow up the denominator just the same
+    if isinstance(base, numbers.Rational) and isinstance(exponent, numbers.Number) and exponent:
+        running.check_bits(_bits(base) * abs(float(exponent)))
+
+
+def _check_lshift(running: Budget, value: Any, shift: Any):
+    if isinstance(shift, numbers.Number) and shift > 0:
+        running.check_bits(_bits(value) + float(shift))
+
+
+def _check_repeat(running: Budget, left: Any, right: Any):
+    for sequence, count in ((left, right), (right, left)):
+        if isinstance(sequence, (str, list, tuple)) and isinstance(count, numbers.Number) and count > 0:
+            running.allocate(len(sequence) * float(count))
+
+
+def _check_mul(running: Budget, left: Any, right: Any):
+    # Repeated squaring of exact numbers doubles their size every step
+    if isinstance(left, numbers.Rational) and isinstance(right, numbers.Rational):
+        running.check_bits(_bits(left) + _bits(right))
+    else:
+        _check_repeat(running, left, right)
+
+
+def _check_concat(running: Budget, left: Any, right: Any):
+    if isinstance(left, (str, list, tuple)) and isinstance(right, (str, list, tuple)):
+        running.allocate(len(left) + len(right))
+
+
+# Checks ran on a BinOp's operands before the operator itself, to refuse oversized results early
+SIZE_CHECKS = {
+    ast.Pow: _check_pow,
+    ast.LShift: _check_lshift,
+    ast.Mult: _check_mul,
+    ast.Add: _check_concat
+}
+
+
+def _metered(iterable: Any, allocate: bool = False) -> Any:
+    """Charge the running budget for going through an iterable, a chunk at a time as it's consumed
+
+    Items cost a quarter step, going through them is cheaper than running compiled code, so
+    something like sum(map(sqrt, range(10**7))) streams through within the budget while a timeout
+    can still cancel it halfway. Collecting a sized iterable is refused up front if it can't fit"""
+    running = budget.get()
+    if running is None:
+        return iterable
+
+    if allocate and isinstance(iterable, collections.abc.Sized):
+        running.allocate(len(iterable))
+        allocate = False
+
+    def chunks(iterator):
+        while True:
+            chunk = list(itertools.islice(iterator, 1024))
+            if allocate:
+                running.allocate(len(chunk))
+            running.step(1 + len(chunk) // 4)
+            yield from chunk
+            if len(chunk) < 1024:
+                return
+
+    return chunks(iter(iterable))
+
+
+def _guarded(function: Callable, allocate: bool = False) -> Callable:
+    """Wrap a function consuming an iterable so it goes through the running budget"""
+    @functools.wraps(function)
+    def guarded(*args):
+        if len(args) == 1:
+            return function(_metered(args[0], allocate))
+        return function(*args)
+
+    return guarded
+
+
+def _indexable(value: Any) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.ndim > 0
+    return isinstance(value, (range, list, tuple, str, LazySequence))
+
+
+class LazySequence:
+    """map / zip / enumerate over sequences, items are computed only when asked for
+
+    Supports len, indexing and slicing without computing anything else, slices are lazy too and
+    share the sources. The repr previews a few items from both ends"""
+    preview = 3
+
+    def __init__(self, name: str, function: Callable, sources: tuple, indices: Optional[range] = None):
+        self.name = name
+        self.function = function
+        self.sources = sources
+        self.indices = range(min(map(len, sources))) if indices is None else indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index: Any) -> Any:
+        try:
+            index = self.indices[index]
+
+        except IndexError:
+            raise IndexError(f'{self.name} index out of range') from None
+
+        if isinstance(index, range):
+            return LazySequence(self.name, self.function, self.sources, index)
+        return self.function(*[source[index] for source in self.sources])
+
+    def __iter__(self):
+        if self.indices == range(len(self.indices)):
+            return map(self.function, *self.sources)
+        return map(self.__getitem__, range(len(self.indices)))
+
+    def __repr__(self):
+        if len(self) > self.preview * 2:
+            head = ', '.join(repr(self[i]) for i in range(self.preview))
+            tail = ', '.join(repr(self[i]) for i in range(-self.preview, 0))
+            return f'{self.name}([{head}, ..., {tail}], length={len(self)})'
+        return f'{self.name}([{", ".join(map(repr, self))}])'
+
+
+class LazyIterable:
+    """Lazy iterable without a length, a new iterator gets made every time it's iterated over
+
+    The repr only computes the items it shows"""
+    preview = 6
+
+    def __init__(self, name: str, factory: Callable):
+        self.name = name
+        self.factory = factory
+
+    def __iter__(self):
+        return self.factory()
+
+    def __repr__(self):
+        items = list(map(repr, itertools.islice(self, self.preview + 1)))
+        if len(items) > self.preview:
+            items[-1] = '...'
+        return f'{self.name}([{", ".join(items)}])'
+
+
+def _items(*items: Any) -> tuple:
+    return items
+
+
+def _check_iterables(name: str, iterables: tuple):
+    """Fail when the lazy value is made rather than when it's first iterated over"""
+    for iterable in iterables:
+        if not isinstance(iterable, collections.abc.Iterable):
+            raise TypeError(f"{name}() got a non iterable {type(iterable).__name__} object")
+
+
+def lazy_map(function: Callable, *iterables: Any) -> Union[LazySequence, LazyIterable]:
+    if not iterables:
+        raise TypeError('map() needs a function and at least one iterable')
+    _check_iterables('map', iterables)
+    if isinstance(function, EvalFunction):  # Skip its extra call for every item
+        function = function.func
+    if all(map(_indexable, iterables)):
+        return LazySequence('map', function, iterables)
+    return LazyIterable('map', lambda: map(function, *iterables))
+
+
+def lazy_zip(*iterables: Any) -> Union[LazySequence, LazyIterable]:
+    _check_iterables('zip', iterables)
+    if iterables and all(map(_indexable, iterables)):
+        return LazySequence('zip', _items, iterables)
+    return LazyIterable('zip', lambda: zip(*iterables))
+
+
+def lazy_enumerate(iterable: Any, start: Any = 0) -> Union[LazySequence, LazyIterable]:
+    _check_iterables('enumerate', (iterable,))
+    start = operator.index(start)
+    if _indexable(iterable):
+        return LazySequence('enumerate', _items, (range(start, start + len(iterable)), iterable))
+    return LazyIterable('enumerate', lambda: enumerate(iterable, start))
+
+
+def lazy_filter(function: Optional[Callable], iterable: Any) -> LazyIterable:
+    _check_iterables('filter', (iterable,))
+    # Filters can go through any amount of items before finding one, so they're metered themselves
+    return LazyIterable('filter', lambda: filter(function, _metered(iterable)))
+
+
+def _to_numpy(value: Any) -> Any:
+    """Convert calc values into something numpy handles natively"""
+    if isinstance(value, decimal.Decimal):
+        if value.is_finite() and value == value.to_integral_value() and abs(value) < 2**63:
+            return int(value)
+        return float(value)
+    if isinstance(value, fractions.Fraction):
+        return value.numerator if value.denominator == 1 else float(value)
+    if isinstance(value, (list, tuple)):
+        return np.array([_to_numpy(i) for i in value])
+    return value
+
+
+class Array(np.ndarray):
+    """Numpy array for vectorized calc math, operators broadcast and mix with Numbers"""
+    def __array_ufunc__(self, ufunc: np.ufunc, method: str, *inputs, **kwargs) -> Any:
+        inputs = [i.view(np.ndarray) if isinstance(i, Array) else _to_numpy(i) for i in inputs]
+        running = budget.get()
+        if running is not None and method == '__call__':
+            size = math.prod(np.broadcast_shapes(*(np.shape(i) for i in inputs)))
+            running.check_array(size)
+
+        if running is not None and ufunc is np.matmul and method == '__call__':
+            # Every output element is a dot product along the shared axis
+            running.step(math.prod(np.shape(inputs[0])) * np.shape(inputs[1])[-1] // 4096)
+
+        return _view(getattr(ufunc, method)(*inputs, **kwargs))
+
+    def __iter__(self):
+        return map(numeric.get().wrap, super().__iter__())
+
+    def __repr__(self):
+        return f'array({np.array2string(self.view(np.ndarray), separator=", ", threshold=64)})'
+
+    def __str__(self):
+        return repr(self)
+
+
+def array(values: Any = ()) -> Array:
+    """Build an Array out of a range, a sequence or any other iterable"""
+    running = budget.get()
+    if isinstance(values, range):
+        if running is not None:
+            running.check_array(len(values))
+        return np.arange(values.start, values.stop, values.step).view(Array)
+
+    if isinstance(values, np.ndarray):
+        return _view(values)
+
+    values = list(_metered(values, allocate=True))
+    if running is not None:
+        running.check_array(len(values))
+    return _view(np.array([_to_numpy(i) for i in values]))
+
+
+class Matrix(Array):
+    """Two dimensional Array, `@` multiplies and it renders as rows"""
+    def __repr__(self):
+        data = self.view(np.ndarray)
+        formatter = None
+        if data.dtype.kind == 'f' and np.all(np.isfinite(data)) and np.all(data == np.round(data)):
+            # 2. reads worse than 2 in results, pad them to keep the columns lined up
+            width = max(len(str(int(i))) for i in (data.min(), data.max()))
+            formatter = {'float_kind': lambda x: str(int(x)).rjust(width)}
+
+        rows = np.array2string(
+            data, separator=', ', prefix='matrix(', threshold=64, precision=8, suppress_small=True,
+            formatter=formatter
+        )
+        return f'matrix({rows})'
+
+
+def _view(value: Any) -> Any:
+    """View numpy results as the matching calc type, scalars go through untouched"""
+    if not isinstance(value, np.ndarray) or not value.ndim:
+        return value
+    return value.view(Matrix if value.ndim == 2 else Array)
+
+
+def _exact(value: Any) -> Any:
+    """Convert a calc value to an exact python int if it's integral, a float otherwise"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int) or isinstance(value, decimal.Decimal) and value == value.to_integral_value():
+        return int(value)
+    return float(value)
+
+
+def matrix(rows: Any) -> Matrix:
+    """Build a Matrix out of a list of rows
+
+    Entries are stored as contiguous float64, unless they're integers too big for a float to hold
+    exactly, in which case the matrix keeps python ints in an object array"""
+    if isinstance(rows, np.ndarray):
+        rows = rows.tolist()
+    rows = [list(_metered(row, allocate=True)) for row in _metered(rows)]
+    if not rows or len(set(map(len, rows))) != 1 or not rows[0]:
+        raise ValueError('matrix rows must all be non-empty and have the same length')
+
+    running = budget.get()
+    if running is not None:
+        running.check_array(len(rows) * len(rows[0]))
+
+    entries = [[_exact(i) for i in row] for row in rows]
+    if any(isinstance(i, int) and abs(i) > 2**53 for row in entries for i in row):
+        data = np.empty((len(rows), len(rows[0])), dtype=object)
+        data[:] = entries
+    else:
+        data = np.ascontiguousarray(entries, dtype=np.float64)
+
+    return data.view(Matrix)
+
+
+def _as_matrix(value: Any) -> np.ndarray:
+    """Plain 2D ndarray out of a Matrix or nested lists, for linear algebra"""
+    if not isinstance(value, np.ndarray):
+        value = matrix(value)
+    if value.ndim != 2:
+        raise ValueError(f'expected a matrix, got {value.ndim} dimensions')
+    return value.view(np.ndarray)
+
+
+def _square(value: Any) -> np.ndarray:
+    value = _as_matrix(value)
+    if value.shape[0] != value.shape[1]:
+        raise ValueError(f'expected a square matrix, got {value.shape[0]}x{value.shape[1]}')
+
+    running = budget.get()
+    if running is not None:
+        running.step(value.shape[0]**3 // 4096)  # Every decomposition here is cubic
+    return value
+
+
+def _linalg(value: np.ndarray) -> np.ndarray:
+    """Object matrices go through LAPACK as floats too, only determinant stays exact for them"""
+    return value.astype(np.float64) if value.dtype == object else value
+
+
+def _bareiss(rows: list) -> int:
+    """Fraction free gaussian elimination, determinant of an integer matrix without rounding"""
+    size = len(rows)
+    sign, previous = 1, 1
+    running = budget.get()
+    for k in range(size - 1):
+        if not rows[k][k]:
+            for i in range(k + 1, size):
+                if rows[i][k]:
+                    rows[k], rows[i] = rows[i], rows[k]
+                    sign = -sign
+                    break
+            else:
+                return 0
+
+        if running is not None:
+            running.step((size - k)**2)
+        for i in range(k + 1, size):
+            for j in range(k + 1, size):
+                rows[i][j] = (rows[i][j] * rows[k][k] - rows[i][k] * rows[k][j]) // previous
+
+        previous = rows[k][k]
+
+    return sign * rows[-1][-1]
+
+
+def determinant(value: Any) -> Any:
+    value = _square(value)
+    if value.dtype == object or value.shape[0] <= 64 and np.all(value == np.round(value)):
+        return _bareiss([[int(i) for i in row] for row in value.tolist()])
+    return np.linalg.det(value)
+
+
+def eigenvalues(value: Any) -> Array:
+    res = np.linalg.eigvals(_linalg(_square(value)))
+    if np.iscomplexobj(res) and not np.any(res.imag):
+        res = res.real
+    return _view(res)
+
+
+def identity(size: Any) -> Matrix:
+    size = int(size)
+    running = budget.get()
+    if running is not None:
+        running.check_array(size * size)
+    return np.identity(size).view(Matrix)
+
+
+def inverse(value: Any) -> Matrix:
+    return _view(np.linalg.inv(_linalg(_square(value))))
+
+
+def solve(value: Any, result: Any) -> Array:
+    """Solve value @ x = result for x"""
+    value = _linalg(_square(value))
+    result = result.view(np.ndarray) if isinstance(result, np.ndarray) else np.array(_to_numpy(result))
+    return _view(np.linalg.solve(value, _linalg(result)))
+
+
+def transpose(value: Any) -> Matrix:
+    return _view(np.ascontiguousarray(_as_matrix(value).T))
+
+
+def _vectorized(function: Callable, numpy_function: Callable, method: Optional[str] = None) -> Callable:
+    """Use numpy_function instead of function whenever it gets called with an array
+
+    If method is given, single Decimals use that Decimal method instead, so results keep the
+    context's precision rather than a float's"""
+    @functools.wraps(function)
+    def vectorized(*args):
+        if len(args) == 1:
+            value = args[0]
+            if value.__class__ is int or value.__class__ is float:  # Fast path, mapping over ranges
+                return function(value)
+            if method and isinstance(value, decimal.Decimal) and not isinstance(value, Undefined):
+                res = getattr(value, method)()
+                if res.is_nan() or res.is_infinite() and value.is_finite():
+                    raise ValueError('math domain error')
+                return res
+
+        for arg in args:
+            if isinstance(arg, np.ndarray):
+                return numpy_function(*args)
+        return function(*args)
+
+    return vectorized
+
+
+def _integer(value: Any) -> int:
+    """Exact int out of an integral calc number, refusing anything with a fractional part"""
+    if isinstance(value, decimal.Decimal):
+        if not value.is_finite() or value != value.to_integral_value():
+            raise ValueError(f'{value} is not an integer')
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return operator.index(value)
+
+
+def _integer_args(function: Callable) -> Callable:
+    @functools.wraps(function)
+    def integer_args(*args):
+        return function(*map(_integer, args))
+
+    return integer_args
+
+
+def _charge(steps: int):
+    running = budget.get()
+    if running is not None:
+        running.step(steps)
+
+
+@_integer_args
+def factor(n: int) -> dict:
+    return primes.factorize(n, _charge)
+
+
+@_integer_args
+def prime_list(n: int) -> Array:
+    running = budget.get()
+    if running is not None:
+        running.check_array(int(n / math.log(n)) if n > 2 else 1)
+    return _view(primes.primes_up_to(n))
+
+
+@_integer_args
+def modpow(base: int, exponent: int, modulus: int) -> int:
+    return primes.modpow(base, exponent, modulus)
+
+
+@_integer_args
+def totient(n: int) -> int:
+    return primes.totient(n, _charge)
+
+
+def _log_array(values: np.ndarray, base: Any = math.e) -> np.ndarray:
+    return np.log(values) / np.log(_to_numpy(base))
+
+
+def _reduction(function: Callable, method: str) -> Callable:
+    """Use an array's own reduction method, or function on a metered iterable otherwise"""
+    def reduction(values: Any) -> Any:
+        if isinstance(values, np.ndarray):
+            return getattr(values, method)()
+        return function(_metered(values))
+
+    reduction.__name__ = method
+    return reduction
+
+
+def _mean(values: Any) -> Any:
+    values = list(values)
+    return sum(values) / len(values)
 
 
 class EvalFunction:
@@ -183,51 +772,76 @@ class EvalLib(collections.abc.Mapping):
             i: EvalFunction(j) for i, j in {
                 # Built-ins
                 'absolute': abs,
-                'all': all,
-                'any': any,
+                'all': _guarded(all),
+                'any': _guarded(any),
+                'array': array,
                 'binary': bin,
                 'boolean': Boolean,
                 'character': chr,
-                'dictionary': dict,
-                'enumerate': enumerate,
-                'filter': filter,
+                'dictionary': _guarded(dict, allocate=True),
+                'enumerate': lazy_enumerate,
+                'filter': lazy_filter,
                 'hexadecimal': hex,
                 'length': len,
-                'list': list,
-                'map': map,
-                'max': max,
-                'min': min,
+                'list': _guarded(list, allocate=True),
+                'map': lazy_map,
+                'max': _guarded(max),
+                'min': _guarded(min),
                 'number': Number,
                 'octal': oct,
                 'range': range,
                 'round': round,
                 'string': str,
-                'zip': zip,
-
-                # Math module
-                'arccos': math.acos,
-                'arccosh': math.acosh,
-                'arcsin': math.asin,
-                'arcsinh': math.asinh,
-                'arctan': math.atan,
-                'arctanh': math.atanh,
-                'ceiling': math.ceil,
-                'cos': math.cos,
-                'cosh': math.cosh,
-                'degrees': math.degrees,
-                'distance': math.dist,
-                'exp': math.exp,
-                'floor': math.floor,
-                'hypotenuse': math.hypot,
-                'log': math.log,
-                'log2': math.log2,
-                'log10': math.log10,
-                'radians': math.radians,
-                'sin': math.sin,
-                'sinh': math.sinh,
-                'sqrt': math.sqrt,
-                'tan': math.tan,
-                'tanh': math.tanh
+                'zip': lazy_zip,
+
+                # Number theory
+                'factor': factor,
+                'gcd': _integer_args(math.gcd),
+                'isprime': _integer_args(primes.is_prime),
+                'lcm': _integer_args(math.lcm),
+                'modpow': modpow,
+                'nthprime': _integer_args(primes.nth_prime),
+                'primes': prime_list,
+                'totient': totient,
+
+                # Linear algebra
+                'determinant': determinant,
+                'eigenvalues': eigenvalues,
+                'identity': identity,
+                'inverse': inverse,
+                'matrix': matrix,
+                'solve': solve,
+                'transpose': transpose,
+
+                # Reductions, arrays use their own methods
+                'mean': _reduction(_mean, 'mean'),
+                'product': _reduction(math.prod, 'prod'),
+                'sum': _reduction(sum, 'sum'),
+
+                # Math module, arrays go through the numpy equivalent
+                'arccos': _vectorized(math.acos, np.arccos),
+                'arccosh': _vectorized(math.acosh, np.arccosh),
+                'arcsin': _vectorized(math.asin, np.arcsin),
+                'arcsinh': _vectorized(math.asinh, np.arcsinh),
+                'arctan': _vectorized(math.atan, np.arctan),
+                'arctanh': _vectorized(math.atanh, np.arctanh),
+                'ceiling': _vectorized(math.ceil, np.ceil),
+                'cos': _vectorized(math.cos, np.cos),
+                'cosh': _vectorized(math.cosh, np.cosh),
+                'degrees': _vectorized(math.degrees, np.degrees),
+                'distance': _vectorized(math.dist, lambda p, q: np.linalg.norm(np.subtract(p, q))),
+                'exp': _vectorized(math.exp, np.exp, 'exp'),
+                'floor': _vectorized(math.floor, np.floor),
+                'hypotenuse': _vectorized(math.hypot, lambda *i: np.sqrt(sum(np.square(j) for j in i))),
+                'log': _vectorized(math.log, _log_array, 'ln'),
+                'log2': _vectorized(math.log2, np.log2),
+                'log10': _vectorized(math.log10, np.log10, 'log10'),
+                'radians': _vectorized(math.radians, np.radians),
+                'sin': _vectorized(math.sin, np.sin),
+                'sinh': _vectorized(math.sinh, np.sinh),
+                'sqrt': _vectorized(math.sqrt, np.sqrt, 'sqrt'),
+                'tan': _vectorized(math.tan, np.tan),
+                'tanh': _vectorized(math.tanh, np.tanh)
             }.items()
         })
         self.constants = FrozenMapping({
@@ -261,7 +875,13 @@ class EvalLib(collections.abc.Mapping):
             'ceil': 'ceiling',
             'cosine': 'cos',
             'deg': 'degrees',
+            'det': 'determinant',
             'dist': 'distance',
+            'eig': 'eigenvalues',
+            'eye': 'identity',
+            'factorize': 'factor',
+            'phi': 'totient',
+            'inv': 'inverse',
             'hypot': 'hypotenuse',
             'prod': 'product',
             'rad': 'radians',
@@ -294,252 +914,768 @@ class EvalLib(collections.abc.Mapping):
 
 
 evallib = EvalLib()
+# Cheap and pure, so calls with constant arguments can be folded while compiling
+FOLDABLE = frozenset(
+    evallib[i] for i in (
+        'absolute', 'boolean', 'character', 'length', 'number', 'round', 'string', 'gcd', 'lcm',
+        'arccos', 'arccosh', 'arcsin', 'arcsinh', 'arctan', 'arctanh', 'ceiling', 'cos', 'cosh', 'degrees',
+        'exp', 'floor', 'hypotenuse', 'log', 'log2', 'log10', 'radians', 'sin', 'sinh', 'sqrt', 'tan', 'tanh'
+    )
+)
+FOLD_STEPS = 2000
+FOLD_BITS = 4096  # Compiling runs on the event loop, so exact numbers past this are left for evaluation
+
+
+def wrap(value: Any) -> Any:
+    """Turn python numbers into their calc counterparts"""
+    if value.__class__ is Number or isinstance(value, Number):
+        return value
+    if value.__class__ is int:  # Fast path, ints convert exactly
+        return decimal.Decimal.__new__(Number, value)
+    if isinstance(value, np.generic):  # Scalars out of arrays
+        value = value.item()
+    if isinstance(value, bool):
+        return Boolean(value)
+    if isinstance(value, numbers.Number):
+        return Number(value)
+    return value
+
+
+class Rational(fractions.Fraction):
+    """An exact fraction that renders as 1/3"""
+    __slots__ = ()
 
+    def __repr__(self):
+        return str(self)
 
-class SafeEvaluator(ast.NodeVisitor):
-    def __init__(self, expression: str):
-        self.expression = expression
-        self.nodes = ast.parse(expression).body
-        self.env = {}
+    def __index__(self):
+        if self._denominator != 1:
+            raise TypeError(f'{self} is not an integer')
+        return self._numerator
+
+
+def _rational(numerator: int, denominator: int) -> Rational:
+    # Both already come reduced out of Fraction's own arithmetic, so skip the gcd in Fraction.__new__
+    self = object.__new__(Rational)
+    self._numerator = numerator
+    self._denominator = denominator
+    return self
+
+
+def _wrap_fraction(value: Any) -> Any:
+    """Turn python numbers into Rationals, floats stay inexact"""
+    if value.__class__ is Rational or value.__class__ is bool:
+        return value
+    if value.__class__ is fractions.Fraction:
+        return _rational(value.numerator, value.denominator)
+    if value.__class__ is int:
+        return _rational(value, 1)
+    if isinstance(value, np.generic):
+        return _wrap_fraction(value.item())
+    if isinstance(value, Boolean):
+        return bool(value)
+    if isinstance(value, decimal.Decimal) and not isinstance(value, Undefined) and value.is_finite():
+        return Rational(value)
+    return value
+
+
+def _wrap_float(value: Any) -> Any:
+    """Turn numbers into plain python floats, ints stay as they are"""
+    if value.__class__ is float or value.__class__ is int or value.__class__ is bool:
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Boolean):
+        return bool(value)
+    if isinstance(value, (decimal.Decimal, fractions.Fraction)) and not isinstance(value, Undefined):
+        return float(value)
+    return value
+
+
+def _decimal_constant(source: str, _) -> Number:
+    with decimal.localcontext(CONTEXT):
+        return Number(source)
+
+
+def _rational_constant(source: str, value: Any) -> Rational:
+    # Floats are read back from their source, so 0.1 is exactly 1/10 instead of the nearest double
+    try:
+        return Rational(source) if isinstance(value, float) else Rational(value)
+
+    except ValueError:
+        return Rational(value)
+
+
+class Backend:
+    """Numeric type an evaluation works in
+
+    constant builds a literal's value from its source and python value, wrap converts the result
+    of every operation, and cost is how many steps of the budget each step is worth"""
+    def __init__(
+        self,
+        name: str,
+        constant: Callable,
+        wrap: Callable,
+        true: Any = TRUE,
+        false: Any = FALSE,
+        context: decimal.Context = CONTEXT,
+        cost: int = 1
+    ):
+        self.name = name
+        self.constant = constant
+        self.wrap = wrap
+        self.true = true
+        self.false = false
+        self.context = context
+        self.cost = cost
+
+
+DECIMAL = Backend('decimal', _decimal_constant, wrap)
+FAST = Backend('fast', lambda _, value: value, _wrap_float, True, False)
+EXACT = Backend('exact', _rational_constant, _wrap_fraction, True, False)
+
+
+def precision(digits: int) -> Backend:
+    """Decimal backend with more digits, steps cost more the more digits there are"""
+    digits = max(1, min(digits, MAX_PRECISION))
+    context = CONTEXT.copy()
+    context.prec = digits
+    return Backend(f'prec={digits}', _decimal_constant, wrap, context=context, cost=math.ceil(digits / 32))
+
+
+numeric = contextvars.ContextVar('numeric', default=DECIMAL)
+DEFINITION = re.compile(r'(^|[;\n])(\s*[A-Za-z_]\w*)\s*\(([\w\s,]*)\)\s*=(?!=)')
+_missing = object()
+
+
+class Frame:
+    """What a user function's body evaluates with, its arguments layered over the caller's env"""
+    __slots__ = ('env', 'budget')
+
+    def __init__(self, env: collections.abc.Mapping, running: Budget):
+        self.env = env
+        self.budget = running
+
+
+def _memo_key(value: Any) -> Hashable:
+    """Key telling apart arguments that compare equal without being the same, like 1, 1.0 and True"""
+    if isinstance(value, decimal.Decimal):  # Its string keeps the exponent, unlike comparisons
+        return type(value), str(value)
+    if isinstance(value, tuple):
+        return tuple, tuple(map(_memo_key, value))
+    if isinstance(value, np.ndarray):
+        raise TypeError('arrays are mutable')
+    return type(value), value
+
+
+class UserFunction:
+    """Function defined with lambda or f(x) = ..., calls are memoized
+
+    Calc values can't be mutated and the environment only changes between statements, which
+    clears the memo table, so a call's result only depends on its arguments. Functions only keep
+    the environment they were defined in, calls charge and memoize in whichever evaluation makes
+    them, so functions kept in a session don't hold on to the evaluation that defined them"""
+    __slots__ = ('params', 'body', 'env', 'source')
+
+    def __init__(self, params: tuple, body: Callable, env: collections.abc.Mapping, source: str):
+        self.params = params
+        self.body = body
+        self.env = env
+        self.source = source
+
+    def __call__(self, *args):
+        if len(args) != len(self.params):
+            raise TypeError(f'{self.source} takes {len(self.params)} arguments, got {len(args)}')
+
+        running = budget.get() or Budget()
+        memo = running.memo
+        try:
+            key = (self, _memo_key(args))
+            res = memo.get(key, _missing)
 
-    def visit(self, node: ast.AST) -> Any:
-        res = super().visit(node)
-        if isinstance(res, (Number, Boolean)):
+        except TypeError:  # Unhashable arguments just don't get memoized
+            key = res = _missing
+
+        if res is not _missing:
             return res
-        if isinstance(res, bool):
-            return Boolean(res)
-        if isinstance(res, numbers.Number):
-            return Number(res)
+
+        running.enter()
+        try:
+            env = collections.ChainMap(dict(zip(self.params, args)), self.env)
+            res = self.body(Frame(env, running))
+
+        except RecursionError:  # Calls take several interpreter frames each, which can run out first
+            raise LimitExceeded(f'went past {running.depth} nested calls') from None
+
+        finally:
+            running.leave()
+
+        if key is not _missing and len(memo) < running.max_memo:
+            running.allocate(1)
+            memo[key] = res
         return res
 
-    def evaluate(self):
-        for node in self.nodes:
-            segment = ast.get_source_segment(self.expression, node)
-            try:
-                yield segment, self.visit(node)
-            except Exception as exc:
-                yield segment, exc
+    def __repr__(self):
+        return self.source
 
-    def generic_visit(self, node: ast.AST) -> Any:
-        raise NotImplementedError(f'Node "{node.__class__.__name__}" is not implemented')
 
-    def visit_Expr(self, node: ast.Expr) -> Any:
+BACKEND_FLAG = re.compile(r'\s*&(fast|exact|prec=(\d+))\s*$')
+
+
+def parse_backend(expression: str) -> tuple:
+    """Strip trailing &fast, &exact and &prec=N flags off an expression, returning it and its Backend"""
+    backend = DECIMAL
+    while match := BACKEND_FLAG.search(expression):
+        expression = expression[:match.start()]
+        if match[1] == 'fast':
+            backend = FAST
+        elif match[1] == 'exact':
+            backend = EXACT
+        else:
+            backend = precision(int(match[2]))
+
+    return expression, backend
+
+
+def _constant(value: Any) -> Callable:
+    """Compiled node for a value known while compiling, other nodes fold it into theirs"""
+    def constant(_):
+        return value
+
+    constant.value = value
+    return constant
+
+
+class Compiler(ast.NodeVisitor):
+    """Compiles parsed statements into trees of closures taking the running SafeEvaluator
+
+    Names, aliases, constants and operators are all resolved here once, so evaluating a compiled
+    statement doesn't go through any visitor dispatch. Operations on constants are folded into
+    constants and branches behind constant tests get pruned, folds that fail are kept to run
+    later and listed in skipped with why. Names read from the environment, other than lambda
+    parameters, are listed in names"""
+    def __init__(self, expression: str, backend: Backend = DECIMAL):
+        self.expression = expression
+        self.backend = backend
+        self.scopes = []  # Parameter names of the lambdas being compiled, innermost last
+        self.skipped = []
+        self.names = set()
+
+    def fold(self, node: ast.AST, compiled: Callable, *operands: Callable) -> Callable:
+        """Evaluate a compiled node right away if all its operands are constants
+
+        Folding runs under a small budget of its own, if it fails the node is kept as it is so the
+        error comes up when it's evaluated. Big exact operands aren't folded, a single operation on
+        them can take longer than the budget can tell"""
+        if not all(hasattr(i, 'value') for i in operands):
+            return compiled
+
+        if any(isinstance(i.value, numbers.Rational) and _bits(i.value) > FOLD_BITS for i in operands):
+            self.skipped.append((ast.get_source_segment(self.expression, node), 'operands are too big'))
+            return compiled
+
+        state = Frame({}, Budget(max_steps=FOLD_STEPS, max_allocation=FOLD_STEPS, max_array_size=FOLD_STEPS))
+        budget_token = budget.set(state.budget)
+        numeric_token = numeric.set(self.backend)
+        try:
+            with decimal.localcontext(self.backend.context):
+                value = compiled(state)
+
+        except Exception as exc:
+            reason = f'{type(exc).__name__}: {exc}'
+            value = _missing
+
+        finally:
+            numeric.reset(numeric_token)
+            budget.reset(budget_token)
+
+        if isinstance(value, np.ndarray) or isinstance(value, str) and len(value) > 1024:
+            reason = 'result is too big to keep'
+            value = _missing
+
+        if value is _missing:
+            self.skipped.append((ast.get_source_segment(self.expression, node), reason))
+            return compiled
+
+        return _constant(value)
+
+    def generic_visit(self, node: ast.AST) -> Callable:
+        message = f'Node "{node.__class__.__name__}" is not implemented'
+
+        def not_implemented(_):
+            raise NotImplementedError(message)
+
+        return not_implemented
+
+    def visit_Expr(self, node: ast.Expr) -> Callable:
         return self.visit(node.value)
 
-    def visit_Constant(self, node: ast.Constant) -> Any:
+    def visit_Constant(self, node: ast.Constant) -> Callable:
         if isinstance(node.value, bool):
-            return Boolean(node.value)
-        if isinstance(node.value, numbers.Number):
-            return Number(ast.get_source_segment(self.expression, node))
-        return node.value
-
-    def visit_BinOp(self, node: ast.BinOp) -> Any:
-        return OPERATORS[type(node.op)](self.visit(node.left), self.visit(node.right))
-
-    def visit_BoolOp(self, node: ast.BoolOp) -> Any:
-        res = None
-        if type(node.op) == ast.And:
-            for value in node.values:
-                res = self.visit(value)
-                if not res:
-                    break
-            return res
+            value = self.backend.true if node.value else self.backend.false
+        elif isinstance(node.value, numbers.Number):
+            value = self.backend.constant(ast.get_source_segment(self.expression, node), node.value)
+        else:
+            value = node.value
+
+        return _constant(value)
+
+    def visit_BinOp(self, node: ast.BinOp) -> Callable:
+        op = OPERATORS[type(node.op)]
+        check = SIZE_CHECKS.get(type(node.op))
+        wrap = self.backend.wrap
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if check is None:
+            def binop(state):
+                state.budget.step()
+                return wrap(op(left(state), right(state)))
+
+            return self.fold(node, binop, left, right)
+
+        def checked_binop(state):
+            state.budget.step()
+            left_value = left(state)
+            right_value = right(state)
+            check(state.budget, left_value, right_value)
+            return wrap(op(left_value, right_value))
+
+        return self.fold(node, checked_binop, left, right)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> Callable:
+        decides = operator.not_ if isinstance(node.op, ast.And) else bool  # Whether a value ends the chain
+        values = []
+        for i, value in enumerate(map(self.visit, node.values), 1):
+            if not hasattr(value, 'value'):
+                values.append(value)
+            elif decides(value.value):
+                values.append(value)
+                break
+            elif i == len(node.values):
+                values.append(value)
+            # Constants that don't end the chain and aren't last can't change the result
+
+        if len(values) == 1 or hasattr(values[0], 'value'):
+            return values[0]
+
+        if isinstance(node.op, ast.And):
+            def and_(state):
+                for value in values:
+                    res = value(state)
+                    if not res:
+                        break
+                return res
 
-        if type(node.op) == ast.Or:
-            for value in node.values:
-                res = self.visit(value)
+            return and_
+
+        def or_(state):
+            for value in values:
+                res = value(state)
                 if res:
                     break
             return res
 
-    def visit_UnaryOp(self, node: ast.UnaryOp) -> Any:
-        return OPERATORS[type(node.op)](self.visit(node.operand))
+        return or_
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> Callable:
+        op = OPERATORS[type(node.op)]
+        wrap = self.backend.wrap
+        operand = self.visit(node.operand)
+
+        def unaryop(state):
+            state.budget.step()
+            return wrap(op(operand(state)))
 
-    def visit_Compare(self, node: ast.Compare) -> Boolean:
+        return self.fold(node, unaryop, operand)
+
+    def visit_Compare(self, node: ast.Compare) -> Callable:
         left = self.visit(node.left)
-        for op, comp in zip(node.ops, node.comparators):
-            right = self.visit(comp)
-            if not OPERATORS[type(op)](left, right):
-                return Boolean(False)
-            left = right
-
-        return Boolean(True)
-
-    def visit_Name(self, node: ast.Name) -> Any:
-        context = type(node.ctx)
-        if context == ast.Load:
-            if node.id.lower() in evallib:
-                return evallib[node.id.lower()]
-            return self.env.get(node.id, undefined)
-        if context == ast.Store:
-            if node.id in evallib:
-                return
-            return node.id
-        return undefined
+        comparisons = [
+            (OPERATORS[type(op)], self.visit(comp)) for op, comp in zip(node.ops, node.comparators)
+        ]
+        true, false = self.backend.true, self.backend.false
+
+        def compare(state):
+            state.budget.step()
+            res = true
+            left_value = left(state)
+            for op, comp in comparisons:
+                right_value = comp(state)
+                outcome = op(left_value, right_value)
+                if isinstance(outcome, np.ndarray):  # Arrays compare element-wise
+                    res = outcome if res is true else res & outcome
+                elif not outcome:
+                    return false
+                left_value = right_value
+
+            return res
+
+        return self.fold(node, compare, left, *(comp for _, comp in comparisons))
+
+    def visit_Name(self, node: ast.Name) -> Callable:
+        if not isinstance(node.ctx, ast.Load):
+            return lambda _: undefined
+
+        if node.id.lower() in evallib and not any(node.id in scope for scope in self.scopes):
+            value = evallib[node.id.lower()]
+            if isinstance(value, Number):  # Constants follow the backend too
+                value = self.backend.wrap(value)
+            return _constant(value)
+
+        name = node.id
+        if not any(name in scope for scope in self.scopes):
+            self.names.add(name)
+        return lambda state: state.env.get(name, undefined)
+
+    def target(self, node: ast.AST) -> Callable:
+        """Compile an assignment target into a function taking the evaluator and a value"""
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in evallib:
+                return lambda state, value: None
+
+            def store(state, value):
+                state.env[name] = value
+
+            return store
+
+        if isinstance(node, (ast.Tuple, ast.List)):
+            targets = list(map(self.target, node.elts))
+
+            def unpack(state, value):
+                values = list(value)
+                if len(values) != len(targets):
+                    raise ValueError(f'expected {len(targets)} values to unpack, got {len(values)}')
+                for target, item in zip(targets, values):
+                    target(state, item)
+
+            return unpack
+
+        raise NotImplementedError(f'Node "{node.__class__.__name__}" is not implemented')
+
+    def visit_Assign(self, node: ast.Assign) -> Callable:
+        try:
+            targets = list(map(self.target, node.targets))
+
+        except NotImplementedError:
+            return self.generic_visit(node.targets[0])
 
-    def visit_Assign(self, node: ast.Assign) -> None:
         value = self.visit(node.value)
-        for target in map(self.visit, node.targets):
-            if target in evallib:
-                continue
-            self.env[target] = value
 
-    def visit_Call(self, node: ast.Call) -> Any:
-        return self.visit(node.func)(*map(self.visit, node.args), **dict(map(self.visit, node.keywords)))
+        def assign(state):
+            res = value(state)
+            state.budget.memo.clear()  # Memoized calls might depend on what gets replaced
+            for target in targets:
+                target(state, res)
+
+        return assign
+
+    def visit_Lambda(self, node: ast.Lambda) -> Callable:
+        arguments = node.args
+        if arguments.vararg or arguments.kwarg or arguments.kwonlyargs or arguments.defaults:
+            return self.generic_visit(arguments)
+
+        params = tuple(i.arg for i in getattr(arguments, 'posonlyargs', []) + arguments.args)
+        source = ast.get_source_segment(self.expression, node)
+        self.scopes.append(params)
+        try:
+            body = self.visit(node.body)
+
+        finally:
+            self.scopes.pop()
+
+        return lambda state: UserFunction(params, body, state.env, source)
+
+    def visit_Call(self, node: ast.Call) -> Callable:
+        func = self.visit(node.func)
+        if node.keywords:
+            return self.generic_visit(node.keywords[0])
+
+        args = list(map(self.visit, node.args))
+        wrap = self.backend.wrap
 
-    def visit_IfExp(self, node: ast.IfExp) -> Any:
-        return self.visit(node.body) if self.visit(node.test) else self.visit(node.orelse)
+        def call(state):
+            state.budget.step()
+            return wrap(func(state)(*[arg(state) for arg in args]))
 
-    def visit_List(self, node: ast.List) -> list[Any]:
-        return list(map(self.visit, node.elts))
+        if isinstance(getattr(func, 'value', None), EvalFunction) and func.value in FOLDABLE:
+            return self.fold(node, call, *args)
+        return call
+
+    def visit_Subscript(self, node: ast.Subscript) -> Callable:
+        if not isinstance(node.ctx, ast.Load):
+            return self.generic_visit(node)
+
+        value = self.visit(node.value)
+        index = self.visit(node.slice)
+        wrap = self.backend.wrap
+
+        def subscript(state):
+            state.budget.step()
+            return wrap(value(state)[index(state)])
+
+        return self.fold(node, subscript, value, index)
+
+    def visit_Slice(self, node: ast.Slice) -> Callable:
+        parts = [self.visit(i) if i else lambda _: None for i in (node.lower, node.upper, node.step)]
+        return lambda state: slice(*[part(state) for part in parts])
+
+    def visit_IfExp(self, node: ast.IfExp) -> Callable:
+        test = self.visit(node.test)
+        if hasattr(test, 'value'):  # Only the branch that's taken gets compiled
+            return self.visit(node.body if test.value else node.orelse)
+
+        body = self.visit(node.body)
+        orelse = self.visit(node.orelse)
+        return lambda state: body(state) if test(state) else orelse(state)
+
+    def visit_List(self, node: ast.List) -> Callable:
+        elts = list(map(self.visit, node.elts))
+        return lambda state: [elt(state) for elt in elts]
+
+    def visit_Tuple(self, node: ast.Tuple) -> Callable:
+        elts = list(map(self.visit, node.elts))
+        return lambda state: tuple([elt(state) for elt in elts])
+
+
+class SafeEvaluator:
+    """Evaluates every statement in an expression, compiled statements are kept around in an LRU
+
+    Variables go in env, passing one in keeps them around between evaluations"""
+    compiled = LRUCache(max_size=512)
+
+    def __init__(
+        self,
+        expression: str,
+        limits: Optional[Budget] = None,
+        backend: Backend = DECIMAL,
+        env: Optional[dict] = None
+    ):
+        self.expression = expression
+        self.backend = backend
+        compiled = self.compiled.get((backend.name, expression))
+        if compiled is None:
+            # f(x) = ... is sugar for f = lambda x: ...
+            source = DEFINITION.sub(r'\1\2 = lambda \3:', expression)
+            compiler = Compiler(source, backend)
+            nodes = [
+                (ast.get_source_segment(source, node), compiler.visit(node))
+                for node in ast.parse(source).body
+            ]
+            compiled = self.compiled[backend.name, expression] = nodes, compiler.skipped, compiler.names
+
+        self.nodes, self.skipped, self.names = compiled
+
+        self.env = {} if env is None else env
+        if limits is None:
+            limits = Budget()
+            limits.max_steps //= backend.cost
+        self.budget = limits
+
+    def evaluate(self):
+        budget_token = budget.set(self.budget)
+        numeric_token = numeric.set(self.backend)
+        try:
+            for segment, statement in self.nodes:
+                try:
+                    yield segment, self.backend.wrap(statement(self))
+                except Exception as exc:
+                    yield segment, exc
+
+        finally:
+            self.budget.memo.clear()  # Its results could keep a lot alive for nothing
+            numeric.reset(numeric_token)
+            budget.reset(budget_token)
+
+    def render(self, value: Any, formatter: Callable = pprint.pformat) -> str:
+        """Format a value under the evaluation's budget, lazy values compute their previews here"""
+        budget_token = budget.set(self.budget)
+        numeric_token = numeric.set(self.backend)
+        try:
+            return formatter(value)
 
-    def visit_Tuple(self, node: ast.Tuple) -> tuple[Any]:
-        return tuple(map(self.visit, node.elts))
+        except Exception as exc:
+            return f'<{exc!r}>'
+
+        finally:
+            numeric.reset(numeric_token)
+            budget.reset(budget_token)
+
+
+PLOT_SAMPLES = 16_384
+RANGE_FLAG = re.compile(r'\s*&([xy])=([^&,]+),([^&,]+)\s*$')
+
+
+def parse_ranges(expression: str) -> tuple:
+    """Strip trailing &x=a,b and &y=a,b flags off an expression, returning it and the ranges"""
+    ranges = {}
+    while match := RANGE_FLAG.search(expression):
+        expression = expression[:match.start()]
+        try:
+            low, high = float(match[2]), float(match[3])
+
+        except ValueError:
+            raise commands.BadArgument(f'invalid {match[1]} range') from None
+
+        if not (math.isfinite(low) and math.isfinite(high) and low < high):
+            raise commands.BadArgument(f'{match[1]} range has to go from a lower to a higher number')
+        ranges.setdefault(match[1], (low, high))
+
+    return expression, ranges
+
+
+def sample(evaluator: SafeEvaluator, **grid: np.ndarray) -> np.ndarray:
+    """Evaluate an expression over a whole grid at once, the last statement's value being the samples"""
+    evaluator.env.update({name: values.view(Array) for name, values in grid.items()})
+    res = None
+    with np.errstate(all='ignore'):  # Poles and domain errors just don't get drawn
+        for _, res in evaluator.evaluate():
+            if isinstance(res, Exception):
+                raise res
+
+    if res is None or isinstance(res, Undefined):
+        raise TypeError('the last statement has to be a defined expression to plot')
+    if np.iscomplexobj(res):
+        raise TypeError('only real values can be plotted')
+
+    shape = next(iter(grid.values())).shape
+    return np.broadcast_to(np.asarray(res, dtype=np.float64), shape)
+
+
+BATCH_MAX_SIZE = 256 * 1024
+BATCH_MAX_LINES = 2000
+BATCH_CHUNK_SIZE = 50
+BATCH_TIMEOUT = 60
+
+
+def batch_lines(text: str) -> list:
+    """(line number, expression) for every line of a batch file, skipping blank lines and # comments"""
+    lines = [(number, line.strip()) for number, line in enumerate(text.splitlines(), 1)]
+    return [(number, line) for number, line in lines if line and not line.startswith('#')]
+
+
+def is_text_file(attachment: discord.Attachment) -> bool:
+    return (attachment.content_type or '').startswith('text/') or attachment.filename.lower().endswith('.txt')
+
+
+def batch_report(lines: list, results: dict) -> str:
+    """Text file with every line's result and how long it took, in the order the lines came in"""
+    width = len(str(lines[-1][0]))
+    output = io.StringIO()
+    for number, line in lines:
+        if number not in results:
+            output.write(f'{number:>{width}} | {line}\n{"":>{width}} | !! skipped, ran out of time\n')
+            continue
+
+        rendered, error, elapsed = results[number]
+        output.write(f'{number:>{width}} | {line}  [{elapsed * 1000:.2f}ms]\n')
+        for value in rendered:
+            output.write(textwrap.indent(value, f'{"":>{width}} | => ', lambda _: True) + '\n')
+        if error is not None:
+            output.write(f'{"":>{width}} | !! {type(error).__name__}: {error}\n')
+
+    return output.getvalue()
 
 
 class Math(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.sandbox = sandbox.Sandbox(**bot.config['sandbox'])
+        self.brainf_cache = LRUCache(**bot.config['brainf_cache'])
+        self.sessions = SessionStore(**bot.config['sessions'])
+        self.save_brainf_cache.start()
+        self.expire_sessions.start()
+
+    def cog_unload(self):
+        self.sandbox.close()
+        self.save_brainf_cache.cancel()
+        self.expire_sessions.cancel()
+        self.brainf_cache.save()
+
+    @tasks.loop(minutes=10)
+    async def save_brainf_cache(self):
+        self.brainf_cache.save()
+
+    @tasks.loop(minutes=5)
+    async def expire_sessions(self):
+        self.sessions.expire()
 
     @commands.command(aliases=['bf'])
     async def brainf(self, ctx: commands.Context, *, code: str):
         """Evaluate [b\\*\\*\\*nfuck code](https://esolangs.org/wiki/Brainfuck)"""
         eval_time = time.perf_counter()
-        instructions = [i for i in code.split('&')[0] if i in '+-,.<>[]']
-        depth = 0
-        for i in instructions:
-            if i == '[':
-                depth += 1
-            elif i == ']':
-                depth -= 1
-            if depth < 0:
-                break
+        try:
+            program = brainf.Program(code.split('&')[0])
 
-        if depth != 0:
+        except SyntaxError as exc:
             await ctx.send(
                 embed=discord.Embed(
                     color=0xfa5050,
                     title='Syntax error!',
-                    description=codeblock(
-                        f'{"".join(instructions)}\n'
-                        f'{"^":>{code.rfind("[" if depth > 0 else "]")+1}}\n'
-                        'Unmatched bracket',
-                        fmt=None
-                    )
+                    description=codeblock(f'{exc.text}\n{"^":>{exc.offset}}\n{exc.msg}', fmt=None)
                 )
             )
             return
 
-        do_wrap = '&wrap' in code
-        instruction_pointer = 0
+        instructions = program.source
         cycle_limit = min(len(instructions) * 2500, 1_000_000)
-        cycles = 0
-        memory = collections.deque([0], maxlen=cycle_limit // 2)
-        cell_pointer = 0
-        output = collections.deque()
-        input_ = collections.deque(map(ord, code[code.find('&input=') + 7:])) if '&input=' in code else []
-        brackets = collections.deque()
-        last_bracket = None
-
-        def run():
-            nonlocal instruction_pointer, memory, cell_pointer, brackets, last_bracket, cycles
-            while instruction_pointer < len(instructions) and cycles < cycle_limit:
-                instr = instructions[instruction_pointer]
-                if instr == '+':
-                    memory[cell_pointer] += 1
-                    if do_wrap and memory[cell_pointer] > 0xff:
-                        memory[cell_pointer] = 0
-                elif instr == '-':
-                    memory[cell_pointer] -= 1
-                    if do_wrap and memory[cell_pointer] < 0:
-                        memory[cell_pointer] = 0xff
-                elif instr == ',':
-                    if input_:
-                        memory[cell_pointer] = input_.popleft()
-                    else:
-                        memory[cell_pointer] = 0
-                elif instr == '.':
-                    output.append(memory[cell_pointer])
-                elif instr == '<':
-                    if cell_pointer > 0:
-                        cell_pointer -= 1
-                elif instr == '>':
-                    cell_pointer += 1
-                    if cell_pointer >= len(memory):
-                        memory.append(0)
-                elif instr == '[':
-                    if memory[cell_pointer] == 0:
-                        depth = 1
-                        while depth:
-                            instruction_pointer += 1
-                            if instructions[instruction_pointer] == '[':
-                                depth += 1
-                            if instructions[instruction_pointer] == ']':
-                                depth -= 1
-                    else:
-                        brackets.append(instruction_pointer)
-                elif instr == ']':
-                    if memory[cell_pointer]:
-                        if brackets:
-                            last_bracket = instruction_pointer = brackets.pop()
-                        else:
-                            instruction_pointer = last_bracket
-                instruction_pointer += 1
-                cycles += 1
-
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            await self.bot.loop.run_in_executor(pool, run)
+        input_ = code[code.find('&input=') + 7:] if '&input=' in code else ''
+        wrap = '&wrap' in code
+        profile = '&profile' in code
+        key = brainf.cache_key(program, input_, wrap, cycle_limit, profile)
+        result = self.brainf_cache.get(key)
+        cached = result is not None
+        if not cached:
+            try:
+                result = await self.sandbox.run(brainf.execute, program, input_, wrap, cycle_limit, profile)
 
+            except sandbox.SandboxError as exc:
+                await ctx.send(
+                    embed=discord.Embed(color=0xfa5050, title='Sandbox error!', description=str(exc))
+                )
+                return
+
+            # Only the output that fits in the embed is kept, programs can print a million cells
+            output = ''.join(chr(i) if i in range(0x110000) else '\ufffd' for i in result['output'][:1024])
+            result = {**result, 'output': output}
+            self.brainf_cache[key] = result
+
+        cycles = result['cycles']
+        timing = f'{(time.perf_counter()-eval_time)*1000:g}ms' + (' (cached)' if cached else '')
         if cycles >= cycle_limit:
             embed = discord.Embed(
                 color=0xfa5050,
                 title='Too many cycles!',
-                description=f'Exited after {cycles} cycles and {(time.perf_counter()-eval_time)*1000:g}ms'
+                description=f'Exited after {cycles} cycles and {timing}'
+            )
+        elif result['error']:
+            embed = discord.Embed(
+                color=0xfa5050,
+                title=result['error'],
+                description=f'Exited after {cycles} cycles and {timing}'
             )
         else:
             embed = discord.Embed(
                 color=0x5050fa,
-                title=f':white_check_mark: Evaluated {len(instructions)} instructions',
-                description=f'Operated {cycles} cycles in {(time.perf_counter()-eval_time)*1000:g}ms'
+                title=f':white_check_mark: Evaluated {len(instructions)} instructions ({len(program)} ops)',
+                description=f'Operated {cycles} cycles in {timing}'
             )
 
-        embed.add_field(
-            name='Output',
-            inline=False,
-            value=codeblock(''.join(chr(i) if i in range(0x110000) else '\ufffd' for i in output), fmt=None)
-        )
+        embed.add_field(name='Output', inline=False, value=codeblock(result['output'], fmt=None))
 
         if '&mem' in code:
-            # |-              A line should fit here              -|
-            # [ Range ] | [   hex cell values   ] [ chrs ]-------| <- accounts 2w chars
-            # 0x00-0x0f | 00 00 00 00 00 00 00 00 ········
-            # ^^^^                    ^^
-            #   index padding (>=4)    cell padding  (>=2)
             formatted_memory = [
-                f'Pointer -> {hex(cell_pointer)}; {len(memory)} cells ({sys.getsizeof(memory)/1024:g}kb)'
+                f'Pointer -> {hex(result["cell_pointer"])}; '
+                f'{result["cells"]} cells ({result["footprint"]/1024:g}kb)',
+                *result['memory']
             ]
-            cell_padding = max(len(hex(max(memory))) - 2, 2) + (min(memory) < 0)
-            index_padding = max(len(hex(len(memory))), 4)
-            grouping = (51 - index_padding * 2) // (cell_padding + 3)
-            lines = itertools.zip_longest(*[iter(memory)] * grouping)
-            for index, row in enumerate(lines):
-                start_index = index * grouping
-                row_length = len([i for i in row if i is not None])
-                row_range = f'{start_index:#0{index_padding}x}-{start_index+row_length:#0{index_padding}x}'
-                row_cells = ' '.join(
-                    f'{i:0{cell_padding}x}' if i is not None else ' ' * cell_padding for i in row
-                )
-                row_chars = ''.join(
-                    chr(i) if i in range(0x110000) and chr(i).isprintable() else '·'
-                    for i in row if i is not None
-                )
-
-                formatted_memory.append(f'{row_range} | {row_cells} {row_chars}')
-                if index > 50:
-                    break
-
             embed.add_field(name='Memory', inline=False, value=codeblock('\n'.join(formatted_memory)))
 
+        if profile:
+            embed.add_field(
+                name='Profile', inline=False, value=codeblock('\n'.join(result['profile']), fmt=None)
+            )
+
         await ctx.send(embed=embed)
 
     @commands.command()
@@ -558,13 +1694,25 @@ class Math(commands.Cog):
         await ctx.send(embed=embed)
 
     @commands.command(aliases=['calc', 'c'])
-    async def calculate(self, ctx: commands.Context, *, expression: str):
+    async def calculate(self, ctx: commands.Context, *, expression: str = ''):
         """Evaluate a math expression
 
-        Uses python syntax, see built-in functions and constants with the functions command"""
+        Uses python syntax, see built-in functions and constants with the functions command.
+        End it with &fast for float math, &exact for fractions or &prec=N for N decimal digits.
+        Variables are kept in your session until you clear it or don't use it for a while.
+        Attach a text file instead to evaluate each of its lines, results are sent back as a file"""
+        attachment = next(filter(is_text_file, ctx.message.attachments), None)
+        if attachment is not None and not parse_backend(expression)[0].strip():  # Flags at most
+            await self.calculate_file(ctx, attachment, expression)
+            return
+        if not expression.strip():
+            raise commands.BadArgument('missing expression or attachment')
+
         eval_time = time.perf_counter()
+        expression, backend = parse_backend(expression)
+        session = self.sessions.get(ctx.author.id)
         try:
-            evaluator = SafeEvaluator(expression)
+            evaluator = SafeEvaluator(expression, backend=backend, env=session.env)
 
         except SyntaxError as exc:
             await ctx.send(
@@ -578,29 +1726,51 @@ class Math(commands.Cog):
 
         values = []
         errors = []
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            def _():
-                decimal.setcontext(
-                    decimal.Context(prec=32, rounding=decimal.ROUND_HALF_EVEN, capitals=0, traps=[])
-                )
-                for segment, value in evaluator.evaluate():
-                    values.append((segment, value))
-                    if isinstance(value, Exception):
-                        errors.append((segment, value))
+        env = {}
 
-            try:
-                await asyncio.wait_for(self.bot.loop.run_in_executor(pool, _), timeout=10)
-            except asyncio.TimeoutError as exc:
-                errors.append(('<unknown>', exc))
+        def _():
+            decimal.setcontext(backend.context.copy())
+            for segment, value in evaluator.evaluate():
+                if evaluator.budget.cancelled:
+                    break
+                # Rendered here on the pool, previews of lazy values can take a while
+                values.append((segment, None if value is None else evaluator.render(value)))
+                if isinstance(value, Exception):
+                    errors.append((segment, value))
+
+            for name, value in dict.items(evaluator.env):
+                env[name] = evaluator.render(value, str)
+
+            session.settle(self.sessions.spill_size)
+
+        # One evaluation per session at a time, they'd step on each other's variables otherwise
+        async with session.lock:
+            job = asyncio.ensure_future(self.bot.compute.run(_))
+            done, pending = await asyncio.wait({job}, timeout=10)
+            if pending:
+                evaluator.budget.cancel()
+                errors.append(('<unknown>', asyncio.TimeoutError()))
+                # The job notices on its next step, the session can't be let go before it stops
+                done, pending = await asyncio.wait({job}, timeout=2)
+
+            if pending:  # Stuck in a single operation, leave the session to it and start a new one
+                if self.sessions.sessions.get(ctx.author.id) is session:
+                    self.sessions.pop(ctx.author.id)
+            else:
+                await job
+
+        self.sessions.trim()
 
         embed = discord.Embed(description=f':clock2: Evaluated in {(time.perf_counter()-eval_time)*1000:g}ms')
+        if backend is not DECIMAL:
+            embed.description += f' ({backend.name})'
 
         embed.add_field(
             name='Results',
             inline=False,
             value=codeblock(
                 '\n'.join(
-                    f'{textwrap.shorten(i, width=30, placeholder="…")} => {pprint.pformat(j)}'
+                    f'{textwrap.shorten(i, width=30, placeholder="…")} => {j}'
                     if j is not None else i for i, j in values
                 )
             )
@@ -625,14 +1795,260 @@ class Math(commands.Cog):
             embed.color = 0x50fa50
             embed.title = f'Evaluated {len(evaluator.nodes)} expressions'
 
-        if evaluator.env:
+        if env:
             embed.add_field(
-                name='Environment',
-                value=codeblock('\n'.join(f'{i} => {j}' for i, j in evaluator.env.items()))
+                name='Environment', value=codeblock('\n'.join(f'{i} => {j}' for i, j in env.items()))
+            )
+            embed.set_footer(text=f'Session: {len(env)} variables, {filesize(session.size)}')
+
+        if evaluator.skipped:
+            embed.add_field(
+                name='Debug',
+                inline=False,
+                value=codeblock('\n'.join(f'Couldn\'t fold {i}: {j}' for i, j in evaluator.skipped))
             )
 
         await ctx.send(embed=embed)
 
+    @commands.command()
+    @commands.is_owner()
+    async def sessions(self, ctx: commands.Context):
+        """List everyone's calc sessions, with how much memory they take, only for the bot owner"""
+        if not self.sessions:
+            await ctx.send(embed=discord.Embed(color=0x5050fa, description='There are no calc sessions'))
+            return
+
+        now = time.monotonic()
+        lines = [
+            f'<@{user}>: {len(session.env)} variables, {filesize(session.size)}, '
+            f'idle for {(now - session.last_used) / 60:.0f}min'
+            for user, session in reversed(self.sessions.sessions.items())
+        ]
+        if len(lines) > 30:
+            lines[30:] = [f'…and {len(lines) - 30} more']
+
+        embed = discord.Embed(
+            color=0x5050fa, title=f'{len(self.sessions)} calc sessions', description='\n'.join(lines)
+        )
+        embed.set_footer(
+            text=f'{filesize(self.sessions.memory)} used out of {filesize(self.sessions.max_memory)}'
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=['forget'])
+    async def clearsession(self, ctx: commands.Context, user: Optional[discord.User] = None):
+        """Clear your calc variables, only the bot owner can clear someone else's"""
+        user = user or ctx.author
+        if user != ctx.author and not await self.bot.is_owner(ctx.author):
+            raise commands.NotOwner('only the bot owner can clear other people\'s sessions')
+
+        session = self.sessions.pop(user.id)
+        if session is None:
+            await ctx.send(embed=discord.Embed(color=0xfafa60, description=f'{user.mention} has no session'))
+            return
+
+        await ctx.send(
+            embed=discord.Embed(
+                color=0x50fa50,
+                description=f'Cleared {len(session.env)} variables ({filesize(session.size)}) '
+                f'from {user.mention}\'s session'
+            )
+        )
+
+    async def calculate_file(self, ctx: commands.Context, attachment: discord.Attachment, flags: str):
+        """Evaluate every line of an attached file, a chunk of lines per compute job
+
+        Each line gets its own budget, chunks that run for too long get cancelled and lines left
+        over once the whole batch runs out of time are skipped"""
+        if attachment.size > BATCH_MAX_SIZE:
+            raise commands.BadArgument(f'file too large, the limit is {filesize(BATCH_MAX_SIZE)}')
+
+        try:
+            lines = batch_lines((await attachment.read()).decode())
+
+        except UnicodeDecodeError:
+            raise commands.BadArgument('the file has to be utf-8 text') from None
+
+        if not lines:
+            raise commands.BadArgument('the file has no expressions')
+        if len(lines) > BATCH_MAX_LINES:
+            raise commands.BadArgument(f'too many lines, the limit is {BATCH_MAX_LINES}')
+
+        _, backend = parse_backend(flags)
+        session = self.sessions.get(ctx.author.id)
+        results = {}
+        current = {}  # Line being run: when it started and its evaluator, once it's compiled
+        stop = threading.Event()
+
+        def _(chunk):
+            decimal.setcontext(backend.context.copy())
+            for number, line in chunk:
+                if stop.is_set():
+                    break
+
+                start = time.perf_counter()
+                current.clear()
+                current[number] = (start, None)
+                try:
+                    evaluator = SafeEvaluator(line, backend=backend, env=session.env)
+
+                except SyntaxError as exc:
+                    results[number] = ([], exc, time.perf_counter() - start)
+                    continue
+
+                current[number] = (start, evaluator)
+                if stop.is_set():  # Timed out while this line was being compiled
+                    evaluator.budget.cancel()
+
+                rendered = []
+                error = None
+                for segment, value in evaluator.evaluate():
+                    if isinstance(value, Exception):
+                        error = error or value
+                    elif value is not None:
+                        rendered.append(evaluator.render(value))
+
+                results[number] = (rendered, error, time.perf_counter() - start)
+
+            session.settle(self.sessions.spill_size)
+
+        eval_time = time.perf_counter()
+        deadline = eval_time + BATCH_TIMEOUT
+        async with ctx.typing(), session.lock:
+            for offset in range(0, len(lines), BATCH_CHUNK_SIZE):
+                if time.perf_counter() >= deadline:
+                    break
+
+                stop.clear()
+                current.clear()
+                # Waits for the job even after cancelling it, so chunks never touch the session at once
+                chunk = lines[offset:offset + BATCH_CHUNK_SIZE]
+                job = asyncio.ensure_future(self.bot.compute.run(_, chunk))
+                done, pending = await asyncio.wait({job}, timeout=min(10, deadline - time.perf_counter()))
+                if pending:
+                    stop.set()
+                    for start, evaluator in list(current.values()):
+                        if evaluator is not None:
+                            evaluator.budget.cancel()
+                    done, pending = await asyncio.wait({job}, timeout=2)
+
+                if pending:  # Stuck in a single operation, leave the session to it and skip the rest
+                    for number, (start, evaluator) in list(current.items()):
+                        results[number] = ([], asyncio.TimeoutError(), time.perf_counter() - start)
+                    if self.sessions.sessions.get(ctx.author.id) is session:
+                        self.sessions.pop(ctx.author.id)
+                    break
+
+                await job
+
+        self.sessions.trim()
+        elapsed = time.perf_counter() - eval_time
+        failed = collections.Counter(
+            type(error).__name__ for _, error, _ in results.values() if error is not None
+        )
+        skipped = len(lines) - len(results)
+        summary = [
+            f'Lines: {len(lines)}',
+            f'Succeeded: {len(results) - sum(failed.values())}',
+            f'Failed: {sum(failed.values())}',
+            f'Skipped: {skipped}',
+        ]
+        if results:
+            slowest = max(results, key=lambda i: results[i][2])
+            summary.append(f'Slowest: line {slowest}, {results[slowest][2] * 1000:.2f}ms')
+
+        embed = discord.Embed(
+            color=0xfa5050 if failed or skipped else 0x50fa50,
+            title=f'Evaluated {len(results)} lines',
+            description=f':clock2: Evaluated in {elapsed * 1000:g}ms'
+        )
+        if backend is not DECIMAL:
+            embed.description += f' ({backend.name})'
+
+        embed.add_field(name='Summary', value=codeblock('\n'.join(summary), fmt=None))
+        if failed:
+            lines_failed = {}
+            for number, result in sorted(results.items()):
+                if result[1] is not None:
+                    lines_failed.setdefault(type(result[1]).__name__, []).append(str(number))
+
+            embed.add_field(
+                name='Errors',
+                value=codeblock(
+                    '\n'.join(
+                        f'{name}: {count} (lines {", ".join(lines_failed[name][:10])}'
+                        f'{", …" if count > 10 else ""})' for name, count in failed.most_common()
+                    ),
+                    fmt=None
+                )
+            )
+
+        report = batch_report(lines, results)
+        await ctx.send(embed=embed, file=discord.File(io.StringIO(report), 'results.txt'))
+
+    @commands.command()
+    async def plot(self, ctx: commands.Context, *, expression: str):
+        """Plot a function of x, or a heatmap of a function of x and y
+
+        Uses the same syntax as calculate with float math, every sample gets evaluated at once.
+        Set ranges with &x=a,b and &y=a,b at the end, x goes from -10 to 10 by default"""
+        eval_time = time.perf_counter()
+        expression, ranges = parse_ranges(expression)
+        x_range = ranges.get('x', (-10.0, 10.0))
+        try:
+            evaluator = SafeEvaluator(expression, backend=FAST)
+
+        except SyntaxError as exc:
+            await ctx.send(
+                embed=discord.Embed(
+                    color=0xfa5050,
+                    title='Syntax error!',
+                    description=codeblock(f'{exc.text.strip()}\n{"^":>{exc.offset}}\n{exc.msg}')
+                )
+            )
+            return
+
+        def _():
+            if 'y' in evaluator.names:
+                y_range = ranges.get('y', (-10.0, 10.0))
+                width, height = plotting.SIZE
+                xs, ys = np.meshgrid(np.linspace(*x_range, width), np.linspace(*y_range, height))
+                png, z_range = plotting.heatmap(sample(evaluator, x=xs, y=ys), x_range, y_range)
+                return png, xs.size, (
+                    f'y: {y_range[0]:g} to {y_range[1]:g}, z: {z_range[0]:.4g} to {z_range[1]:.4g}'
+                )
+
+            xs = np.linspace(*x_range, PLOT_SAMPLES)
+            png, y_range = plotting.curve(xs, sample(evaluator, x=xs), x_range, ranges.get('y'))
+            return png, xs.size, f'y: {y_range[0]:g} to {y_range[1]:g}'
+
+        try:
+            png, samples, footer = await asyncio.wait_for(self.bot.compute.run(_), timeout=10)
+
+        except Exception as exc:
+            if isinstance(exc, asyncio.TimeoutError):
+                evaluator.budget.cancel()
+            elif isinstance(exc, commands.CommandError):
+                raise
+
+            await ctx.send(
+                embed=discord.Embed(
+                    color=0xfa5050,
+                    title="Couldn't plot that!",
+                    description=codeblock(''.join(traceback.format_exception_only(type(exc), exc)))
+                )
+            )
+            return
+
+        embed = discord.Embed(
+            color=0x50fa50,
+            title=textwrap.shorten(expression, width=200, placeholder='…'),
+            description=f':clock2: Evaluated {samples} samples in {(time.perf_counter()-eval_time)*1000:g}ms'
+        )
+        embed.set_image(url='attachment://plot.png')
+        embed.set_footer(text=f'x: {x_range[0]:g} to {x_range[1]:g}, {footer}')
+        await ctx.send(embed=embed, file=discord.File(io.BytesIO(png), 'plot.png'))
+
 
 def setup(bot):
     bot.add_cog(Math(bot))
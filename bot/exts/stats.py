@@ -111,6 +111,8 @@ class Stats(commands.Cog):
             )
         )
 
+        embed.add_field(name='Compute pool', value=self.bot.compute.stats())
+
         await ctx.send(embed=embed)
 
 
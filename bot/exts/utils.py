@@ -79,13 +79,9 @@ class Utils(commands.Cog):
             embed.set_author(name=f'Poll by {ctx.author}', icon_url=ctx.author.avatar_url)
             embed.set_footer(text=f'{ctx.prefix}poll')
             message = await ctx.send(embed=embed)
-            try:
-                await message.add_reaction(self.bot.get_emoji(757023230073634922))
-                await message.add_reaction(self.bot.get_emoji(757019524058054686))
-
-            except discord.InvalidArgument:
-                pass
-
+            self.bot.reactions.add(
+                message, self.bot.get_emoji(757023230073634922), self.bot.get_emoji(757019524058054686)
+            )
             return
 
         description = ''
@@ -116,12 +112,7 @@ class Utils(commands.Cog):
         embed.set_footer(text=f'{ctx.prefix}poll')
 
         message = await ctx.send(embed=embed)
-        for emote, _ in poll:
-            try:
-                await message.add_reaction(emote.strip())
-
-            except discord.NotFound:
-                pass
+        self.bot.reactions.add(message, *(emote.strip() for emote, _ in poll))
 
 
 def setup(bot):
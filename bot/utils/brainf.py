@@ -0,0 +1,417 @@
+import array
+import collections
+import hashlib
+import json
+import sys
+from typing import Iterable, List, Optional
+
+from bot.utils.formatting import hexdump
+
+# Opcodes, each op is stored as an (opcode, argument) pair
+ADD, MOVE, OUTPUT, INPUT, OPEN, CLOSE, CLEAR, MULTIPLY = range(8)
+OPCODE_NAMES = ['add', 'move', 'output', 'input', 'open', 'close', 'clear', 'multiply']
+
+
+def _match_idiom(body: str) -> Optional[tuple]:
+    """Recognise [-] style clear loops and [->+<] style move/copy loops
+
+    Returns (delta, targets, low, high) where delta is what the loop adds to its own cell each
+    iteration, targets are (offset, factor) pairs and low/high are the offsets the body walks over"""
+    if not body or any(i not in '+-<>' for i in body):
+        return None
+
+    offset = low = high = 0
+    changes = collections.defaultdict(int)
+    for char in body:
+        if char == '>':
+            offset += 1
+            high = max(high, offset)
+        elif char == '<':
+            offset -= 1
+            low = min(low, offset)
+        else:
+            changes[offset] += 1 if char == '+' else -1
+
+    if offset != 0 or changes[0] not in (-1, 1):
+        return None
+
+    targets = tuple((i, j) for i, j in sorted(changes.items()) if i != 0 and j != 0)
+    return changes[0], targets, low, high
+
+
+class Program:
+    """Brainf source compiled down to a flat list of ops
+
+    Runs of +- and <> are folded into counted ADD and MOVE ops, every bracket pair is resolved to
+    its partner's index up front, and clear/move loops get a CLEAR or MULTIPLY op placed right
+    before them which skips the loop whenever it can be done in one step"""
+    def __init__(self, source: Iterable[str]):
+        self.source = ''.join(i for i in source if i in '+-,.<>[]')
+        self.ops = []
+        self.spans = []
+
+        matches = {}
+        stack = []
+        for index, char in enumerate(self.source):
+            if char == '[':
+                stack.append(index)
+            elif char == ']':
+                if not stack:
+                    raise SyntaxError('Unmatched bracket', ('<brainf>', 1, index + 1, self.source))
+                matches[stack.pop()] = index
+
+        if stack:
+            raise SyntaxError('Unmatched bracket', ('<brainf>', 1, stack[-1] + 1, self.source))
+
+        index = 0
+        loops = []
+        while index < len(self.source):
+            start = index
+            char = self.source[index]
+            if char in '+-':
+                delta = 0
+                while index < len(self.source) and self.source[index] in '+-':
+                    delta += 1 if self.source[index] == '+' else -1
+                    index += 1
+
+                if delta:
+                    self._emit(ADD, delta, start, index)
+                continue
+
+            if char in '<>':
+                # Only runs in the same direction get folded, since moving left stops at cell 0
+                while index < len(self.source) and self.source[index] == char:
+                    index += 1
+
+                self._emit(MOVE, index - start if char == '>' else start - index, start, index)
+                continue
+
+            index += 1
+            if char == '.':
+                self._emit(OUTPUT, None, start, index)
+
+            elif char == ',':
+                self._emit(INPUT, None, start, index)
+
+            elif char == '[':
+                fast_path = None
+                idiom = _match_idiom(self.source[index:matches[start]])
+                if idiom is not None:
+                    fast_path = len(self.ops)
+                    self._emit(MULTIPLY if idiom[1] else CLEAR, idiom, start, matches[start] + 1)
+
+                loops.append((len(self.ops), fast_path))
+                self._emit(OPEN, None, start, matches[start] + 1)
+
+            elif char == ']':
+                open_index, fast_path = loops.pop()
+                self.ops[open_index] = (OPEN, len(self.ops))
+                if fast_path is not None:
+                    code, arg = self.ops[fast_path]
+                    self.ops[fast_path] = (code, (arg, len(self.ops)))
+
+                self._emit(CLOSE, open_index, start, index)
+
+    def _emit(self, code: int, arg, start: int, end: int):
+        self.ops.append((code, arg))
+        self.spans.append((start, end))
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+
+class Tape:
+    """Flat cell storage that grows in chunks
+
+    Wrapping cells live in a bytearray, otherwise in an array of signed 64 bit ints. Either way
+    `cells` is extended in place, so it's safe to keep a reference to it while running"""
+    CHUNK_SIZE = 4096
+
+    def __init__(self, wrap: bool = False, max_cells: int = 500_000):
+        self.max_cells = max_cells
+        size = min(self.CHUNK_SIZE, max_cells)
+        self.cells = bytearray(size) if wrap else array.array('q', bytes(size * 8))
+        self.used = 1
+
+    def grow(self, size: int) -> bool:
+        """Make sure at least `size` cells are in use, False if that'd go past max_cells"""
+        if size > self.max_cells:
+            return False
+
+        if size > len(self.cells):
+            extra = min(-(-(size - len(self.cells)) // self.CHUNK_SIZE) * self.CHUNK_SIZE,
+                        self.max_cells - len(self.cells))
+            if isinstance(self.cells, bytearray):
+                self.cells.extend(bytes(extra))
+            else:
+                self.cells.frombytes(bytes(extra * self.cells.itemsize))
+
+        self.used = max(self.used, size)
+        return True
+
+    def view(self) -> memoryview:
+        """Zero-copy view over the cells in use"""
+        return memoryview(self.cells)[:self.used]
+
+    @property
+    def footprint(self) -> int:
+        """Bytes taken by the underlying buffer"""
+        return sys.getsizeof(self.cells)
+
+    def __len__(self) -> int:
+        return self.used
+
+
+class Interpreter:
+    """Runs a compiled program, every op executed counts as one cycle"""
+    def __init__(self, program: Program, input_: Iterable[int] = (), wrap: bool = False,
+                 cycle_limit: int = 1_000_000):
+        self.program = program
+        self.input = collections.deque(i & 0xff for i in input_) if wrap else collections.deque(input_)
+        self.wrap = wrap
+        self.cycle_limit = cycle_limit
+        self.tape = Tape(wrap, max(cycle_limit // 2, 1))
+        self.cell_pointer = 0
+        self.output = []
+        self.cycles = 0
+        self.error = None
+
+    def run(self):
+        ops = self.program.ops
+        tape = self.tape
+        memory = tape.cells
+        used = tape.used
+        wrap = self.wrap
+        cycle_limit = self.cycle_limit
+        pointer = self.cell_pointer
+        cycles = self.cycles
+        index = 0
+        try:
+            while index < len(ops) and cycles < cycle_limit:
+                code, arg = ops[index]
+                if code == ADD:
+                    if wrap:
+                        memory[pointer] = (memory[pointer] + arg) & 0xff
+                    else:
+                        memory[pointer] += arg
+
+                elif code == MOVE:
+                    pointer += arg
+                    if pointer < 0:
+                        pointer = 0
+                    elif pointer >= used:
+                        used = pointer + 1
+                        if not tape.grow(used):
+                            self.error = 'Out of memory!'
+                            break
+
+                elif code == OPEN:
+                    if not memory[pointer]:
+                        index = arg
+
+                elif code == CLOSE:
+                    if memory[pointer]:
+                        index = arg
+
+                elif code == OUTPUT:
+                    self.output.append(memory[pointer])
+
+                elif code == INPUT:
+                    memory[pointer] = self.input.popleft() if self.input else 0
+
+                elif code == CLEAR or code == MULTIPLY:
+                    (delta, targets, low, high), close_index = arg
+                    value = memory[pointer]
+                    # Without wrapping a cell can only reach 0 by counting towards it, and the body
+                    # mustn't bump into cell 0, otherwise fall through to the plain loop
+                    count = (-value * delta) & 0xff if wrap else -value * delta
+                    if value == 0:
+                        index = close_index
+
+                    elif count > 0 and pointer + low >= 0:
+                        if pointer + high >= used:
+                            used = pointer + high + 1
+                            if not tape.grow(used):
+                                self.error = 'Out of memory!'
+                                break
+
+                        for offset, factor in targets:
+                            if wrap:
+                                memory[pointer + offset] = (memory[pointer + offset] + count * factor) & 0xff
+                            else:
+                                memory[pointer + offset] += count * factor
+
+                        memory[pointer] = 0
+                        index = close_index
+
+                index += 1
+                cycles += 1
+
+        except OverflowError:
+            self.error = 'Cell overflow!'
+
+        self.cell_pointer = min(pointer, tape.used - 1)
+        self.cycles = cycles
+        return self
+
+
+class ProfilingInterpreter(Interpreter):
+    """Interpreter that also counts how many times every op was run
+
+    This is a separate copy of the run loop so the plain interpreter doesn't pay for counting"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counts = [0] * len(self.program)
+
+    def run(self):
+        ops = self.program.ops
+        tape = self.tape
+        memory = tape.cells
+        used = tape.used
+        wrap = self.wrap
+        cycle_limit = self.cycle_limit
+        pointer = self.cell_pointer
+        cycles = self.cycles
+        counts = self.counts
+        index = 0
+        try:
+            while index < len(ops) and cycles < cycle_limit:
+                code, arg = ops[index]
+                counts[index] += 1
+                if code == ADD:
+                    if wrap:
+                        memory[pointer] = (memory[pointer] + arg) & 0xff
+                    else:
+                        memory[pointer] += arg
+
+                elif code == MOVE:
+                    pointer += arg
+                    if pointer < 0:
+                        pointer = 0
+                    elif pointer >= used:
+                        used = pointer + 1
+                        if not tape.grow(used):
+                            self.error = 'Out of memory!'
+                            break
+
+                elif code == OPEN:
+                    if not memory[pointer]:
+                        index = arg
+
+                elif code == CLOSE:
+                    if memory[pointer]:
+                        index = arg
+
+                elif code == OUTPUT:
+                    self.output.append(memory[pointer])
+
+                elif code == INPUT:
+                    memory[pointer] = self.input.popleft() if self.input else 0
+
+                elif code == CLEAR or code == MULTIPLY:
+                    (delta, targets, low, high), close_index = arg
+                    value = memory[pointer]
+                    # Without wrapping a cell can only reach 0 by counting towards it, and the body
+                    # mustn't bump into cell 0, otherwise fall through to the plain loop
+                    count = (-value * delta) & 0xff if wrap else -value * delta
+                    if value == 0:
+                        index = close_index
+
+                    elif count > 0 and pointer + low >= 0:
+                        if pointer + high >= used:
+                            used = pointer + high + 1
+                            if not tape.grow(used):
+                                self.error = 'Out of memory!'
+                                break
+
+                        for offset, factor in targets:
+                            if wrap:
+                                memory[pointer + offset] = (memory[pointer + offset] + count * factor) & 0xff
+                            else:
+                                memory[pointer + offset] += count * factor
+
+                        memory[pointer] = 0
+                        index = close_index
+
+                index += 1
+                cycles += 1
+
+        except OverflowError:
+            self.error = 'Cell overflow!'
+
+        self.cell_pointer = min(pointer, tape.used - 1)
+        self.cycles = cycles
+        return self
+
+    def loops(self) -> List[tuple]:
+        """(start, end, iterations, total cycles, self cycles) for every loop, in source order
+
+        Cycles include the loop's CLEAR/MULTIPLY op, self cycles leave out cycles of nested loops"""
+        ops = self.program.ops
+        loops = []
+        stack = []
+        for index, (code, arg) in enumerate(ops):
+            if code == OPEN:
+                stack.append((len(loops), 0))
+                loops.append(None)
+
+            elif code == CLOSE:
+                position, nested = stack.pop()
+                start = arg - 1 if arg and ops[arg - 1][0] in (CLEAR, MULTIPLY) else arg
+                total = sum(self.counts[start:index + 1])
+                loops[position] = (
+                    self.program.spans[start][0], self.program.spans[index][1], self.counts[index], total,
+                    total - nested
+                )
+                if stack:
+                    parent, parent_nested = stack.pop()
+                    stack.append((parent, parent_nested + total))
+
+        return loops
+
+    def report(self, top: int = 5) -> List[str]:
+        """Hottest loops and ops, by share of the cycles spent on them"""
+        cycles = max(self.cycles, 1)
+        lines = ['Hot loops (self cycles, span, iterations):']
+        for start, end, iterations, _, self_cycles in sorted(self.loops(), key=lambda i: -i[4])[:top]:
+            code = self.program.source[start:end]
+            code = code if len(code) <= 18 else code[:17] + '…'
+            lines.append(f'{self_cycles/cycles:6.1%} {start:>4}-{end:<4} {iterations:>7}x {code}')
+
+        if len(lines) == 1:
+            lines.append('   (no loops were run)')
+
+        lines.append('Hot ops (cycles, span, op):')
+        for index in sorted(range(len(self.counts)), key=lambda i: -self.counts[i])[:top]:
+            if not self.counts[index]:
+                break
+
+            start, end = self.program.spans[index]
+            name = OPCODE_NAMES[self.program.ops[index][0]]
+            lines.append(f'{self.counts[index]/cycles:6.1%} {start:>4}-{end:<4} {name}')
+
+        return lines
+
+
+def cache_key(program: Program, input_: str, wrap: bool, cycle_limit: int, profile: bool = False) -> str:
+    """Hash of everything a run's result depends on"""
+    return hashlib.sha256(
+        json.dumps([program.source, input_, wrap, cycle_limit, profile]).encode()
+    ).hexdigest()
+
+
+def execute(program: Program, input_: str = '', wrap: bool = False, cycle_limit: int = 1_000_000,
+            profile: bool = False) -> dict:
+    """Run a program and sum its results up as a JSON serializable dict"""
+    interpreter_class = ProfilingInterpreter if profile else Interpreter
+    interpreter = interpreter_class(program, map(ord, input_), wrap, cycle_limit).run()
+    return {
+        'output': interpreter.output,
+        'cycles': interpreter.cycles,
+        'error': interpreter.error,
+        'cell_pointer': interpreter.cell_pointer,
+        'cells': len(interpreter.tape),
+        'footprint': interpreter.tape.footprint,
+        'memory': hexdump(interpreter.tape.view()),
+        'profile': interpreter.report() if profile else None
+    }
@@ -0,0 +1,78 @@
+import collections
+import json
+import os
+import threading
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry once full
+
+    If a path is given, entries can be loaded from and saved to it as JSON, so keys have to be
+    strings and values JSON serializable. Compute pool threads share caches, so every access
+    holds a lock"""
+    def __init__(self, max_size: int = 128, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self.entries[key]
+
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self.entries.pop(key, default)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def load(self):
+        """Read entries back from the cache file, if there's one"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path) as file:
+            for key, value in json.load(file):
+                self[key] = value
+
+    def save(self):
+        """Write entries out to the cache file, oldest first"""
+        if not self.path:
+            return
+
+        # Write to a temporary file first so a crash never leaves a half written cache behind
+        with self._lock:
+            entries = list(self.entries.items())
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump(entries, file)
+
+        os.replace(self.path + '.tmp', self.path)
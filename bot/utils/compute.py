@@ -0,0 +1,78 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable
+
+from discord.ext import commands
+
+
+class ComputeBusy(commands.CommandError):
+    """The compute pool is saturated, so the job got refused instead of queued"""
+
+
+class ComputePool:
+    """Bounded thread pool shared by every command doing CPU heavy work
+
+    At most `workers` jobs run at once and at most `queue_size` more wait for a free thread,
+    anything past that is refused right away with ComputeBusy instead of piling up"""
+    def __init__(self, workers: int = 4, queue_size: int = 8):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='compute')
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.running
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.workers + self.queue_size
+
+    def _job(self, func: Callable, args: tuple) -> Any:
+        with self._lock:
+            self.running += 1
+
+        try:
+            return func(*args)
+
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run func on a pool thread, raising ComputeBusy if the queue is full"""
+        if self.saturated:
+            self.rejected += 1
+            raise ComputeBusy('too many calculations are running right now, try again in a bit')
+
+        with self._lock:
+            self.pending += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        # Jobs count as pending until their thread is done with them, even if whoever awaited them
+        # timed out, so saturation reflects the threads that are actually busy
+        future = self.executor.submit(self._job, func, args)
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _done(self, _):
+        with self._lock:
+            self.pending -= 1
+
+    def stats(self) -> str:
+        return (
+            f'Running: {self.running}/{self.workers}\n'
+            f'Queued: {self.queued}/{self.queue_size} (peak {self.peak_queued})\n'
+            f'Completed: {self.completed}\n'
+            f'Rejected: {self.rejected}'
+        )
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 
 def codeblock(content: str, max_size: int = 1024, fmt: Optional[str] = 'py') -> Optional[str]:
@@ -13,3 +13,42 @@ def codeblock(content: str, max_size: int = 1024, fmt: Optional[str] = 'py') ->
         return f'```{fmt}\n{content}\n```'
 
     return f'```{content}```'
+
+
+def hexdump(cells: memoryview, width: int = 51, max_rows: int = 52) -> List[str]:
+    """Format integer cells as hexdump rows that fit in `width` characters
+
+    Rows are read as slices of the given view, so the cells are never copied"""
+    # |-              A line should fit here              -|
+    # [ Range ] | [   hex cell values   ] [ chrs ]-------| <- accounts 2w chars
+    # 0x00-0x0f | 00 00 00 00 00 00 00 00 ········
+    # ^^^^                    ^^
+    #   index padding (>=4)    cell padding  (>=2)
+    if not cells:
+        return []
+
+    cell_padding = max(len(hex(max(cells))) - 2, 2) + (min(cells) < 0)
+    index_padding = max(len(hex(len(cells))), 4)
+    grouping = max((width - index_padding * 2) // (cell_padding + 3), 1)
+    rows = []
+    for start in range(0, min(len(cells), grouping * max_rows), grouping):
+        row = cells[start:start + grouping]
+        row_range = f'{start:#0{index_padding}x}-{start+len(row):#0{index_padding}x}'
+        row_cells = ' '.join(f'{i:0{cell_padding}x}' for i in row).ljust(grouping * (cell_padding + 1) - 1)
+        row_chars = ''.join(chr(i) if i in range(0x110000) and chr(i).isprintable() else '·' for i in row)
+        rows.append(f'{row_range} | {row_cells} {row_chars}')
+
+    return rows
+
+
+def filesize(size: float) -> str:
+    """Human readable byte count, like 12.3 KiB"""
+    if size < 1024:
+        return f'{size} B'
+
+    for unit in ('KiB', 'MiB'):
+        size /= 1024
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+
+    return f'{size / 1024:.1f} GiB'
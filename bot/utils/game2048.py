@@ -0,0 +1,349 @@
+import functools
+import itertools
+import math
+import secrets
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from bot.utils.cache import LRUCache
+
+# Same order as the arrow reactions
+LEFT, DOWN, UP, RIGHT = range(4)
+MAX_SIZE = 10  # Bigger boards don't fit in an embed
+# Rows of tile exponents are looked up in a table when every possible row fits in this many entries
+TABLE_ROWS = 1 << 16
+MIN_TABLE_ALPHABET = 12  # Tables that can't hold a 2048 tile aren't worth building
+# Searched board values kept, a hint adds up to ~10k of them at ~250 bytes each
+SEARCH_TABLE_SIZE = 1 << 16
+
+
+def slide(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Slide rows of tile exponents towards index 0, merging equal tiles
+
+    Returns the moved rows and the score of each. Runs of equal tiles pair up from the front and
+    merged tiles don't merge again in the same move, like 1 1 1 1 -> 2 2 0 0"""
+    rows = np.asarray(rows, dtype=np.uint8).reshape(-1, rows.shape[-1])
+    n = rows.shape[1]
+    # A stable sort on emptiness packs tiles to the front without reordering them
+    rows = np.take_along_axis(rows, np.argsort(rows == 0, axis=1, kind='stable'), axis=1)
+    same = (rows[:, 1:] == rows[:, :-1]) & (rows[:, 1:] != 0)  # Tile equals the one before it
+
+    positions = np.arange(n)
+    starts = np.where(np.column_stack((np.ones(len(rows), bool), ~same)), positions, 0)
+    run_index = positions - np.maximum.accumulate(starts, axis=1)  # Position within a run of equal tiles
+    merges = same & (run_index[:, :-1] % 2 == 0)  # Tile i absorbs tile i + 1
+
+    scores = np.where(merges, np.left_shift(1, rows[:, :-1].astype(np.int64) + 1), 0).sum(axis=1)
+    rows = rows.copy()
+    rows[:, :-1] += merges
+    rows[:, 1:][merges] = 0
+    return np.take_along_axis(rows, np.argsort(rows == 0, axis=1, kind='stable'), axis=1), scores
+
+
+class Engine:
+    """Moves boards of one size in every direction at once
+
+    Boards are arrays of tile exponents, 0 being empty. Every direction reads the board as lines
+    sliding towards their first cell, so all four moves of any number of boards come down to one
+    batch of row slides, gathered and scattered back with fancy indexing. Small sizes look rows
+    up in a precomputed table instead, as long as no tile is past the table's alphabet"""
+    def __init__(self, size: int):
+        self.size = size
+        cells = np.arange(size * size).reshape(size, size)
+        # lines[direction, line, position] is the board cell sliding into that position
+        self.lines = np.stack((cells, cells.T[:, ::-1], cells.T, cells[:, ::-1])).reshape(4, -1)
+
+        self.alphabet = min(32, int(round(TABLE_ROWS**(1 / size))))
+        self.table = self.table_scores = None
+        if self.alphabet >= MIN_TABLE_ALPHABET:
+            self.powers = self.alphabet**np.arange(size, dtype=np.int64)
+            every_row = np.indices((self.alphabet,) * size).reshape(size, -1).T[:, ::-1]
+            self.table, self.table_scores = slide(every_row)
+
+    def slide(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.table is not None and rows.max(initial=0) < self.alphabet:
+            keys = rows.astype(np.int64) @ self.powers
+            return self.table[keys], self.table_scores[keys]
+        return slide(rows)
+
+    def moves(self, boards: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Every move of boards shaped (..., size, size)
+
+        Returns the successor boards (..., 4, size, size), the score of each move (..., 4) and
+        whether it's legal, which is whether it changes the board at all (..., 4)"""
+        boards = np.asarray(boards, dtype=np.uint8)
+        batch = boards.shape[:-2]
+        flat = boards.reshape(-1, 1, self.size * self.size)
+        lines = flat[:, :, self.lines].reshape(-1, self.size)
+        moved, scores = self.slide(lines)
+
+        successors = np.empty((len(flat), 4, self.size * self.size), np.uint8)
+        np.put_along_axis(
+            successors, np.broadcast_to(self.lines, successors.shape), moved.reshape(successors.shape), axis=2
+        )
+        legal = (successors != flat).any(axis=2)
+        return (
+            successors.reshape(*batch, 4, self.size, self.size),
+            scores.reshape(*batch, 4, self.size).sum(axis=-1),
+            legal.reshape(*batch, 4)
+        )
+
+    def move(self, board: np.ndarray, direction: int) -> Tuple[np.ndarray, int, bool]:
+        """One move of a single board, returning the new board, its score and whether it's legal"""
+        successors, scores, legal = self.moves(board)
+        return successors[direction], int(scores[direction]), bool(legal[direction])
+
+
+@functools.lru_cache(maxsize=None)
+def engine(size: int) -> Engine:
+    """Engines are built once per size, tables included"""
+    return Engine(size)
+
+
+def spawn(board: np.ndarray, rng: Optional[secrets.SystemRandom] = None) -> bool:
+    """Put a 2, or a 4 one time out of 11, on a random empty cell, False if there's none"""
+    rng = rng or secrets.SystemRandom()
+    empty = np.flatnonzero(board == 0)
+    if not empty.size:
+        return False
+
+    board.flat[empty[rng.randrange(empty.size)]] = 1 if rng.randrange(11) < 10 else 2
+    return True
+
+
+def new_board(size: int, rng: Optional[secrets.SystemRandom] = None) -> np.ndarray:
+    board = np.zeros((size, size), np.uint8)
+    spawn(board, rng)
+    return board
+
+
+def spawn_many(boards: np.ndarray, rng: np.random.Generator, which: Optional[np.ndarray] = None):
+    """spawn on a batch of boards at once with the same odds, boards that are full are left alone
+
+    which picks the boards to spawn on, all of them by default"""
+    selected = boards if which is None else boards[which]
+    flat = selected.reshape(len(selected), boards.shape[-2] * boards.shape[-1])
+    empty = flat == 0
+    # The biggest of a random number per empty cell is a uniformly random empty cell
+    cells = np.argmax(rng.random(flat.shape) * empty, axis=1)
+    tiles = np.where(rng.integers(11, size=len(flat)) < 10, 1, 2).astype(np.uint8)
+    open_ = np.flatnonzero(empty.any(axis=1))
+    flat[open_, cells[open_]] = tiles[open_]
+    if which is not None:
+        boards[which] = selected
+
+
+def random_policy(
+    successors: np.ndarray, scores: np.ndarray, legal: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """Any legal move, all equally likely"""
+    return np.argmax(rng.random(legal.shape) * legal, axis=1)
+
+
+def greedy_policy(
+    successors: np.ndarray, scores: np.ndarray, legal: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """The legal move scoring the most right away, ties broken at random"""
+    return np.argmax(np.where(legal, scores + rng.random(legal.shape), -1), axis=1)
+
+
+def simulate(
+    size: int,
+    games: int,
+    policy: Callable = random_policy,
+    rng: Optional[np.random.Generator] = None,
+    max_moves: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Play games all at once until they end or reach max_moves, returning each one's score, move
+    count and biggest tile
+
+    Policies get the successors, scores and legality of every move of the games still going and
+    return the direction each of them plays, which has to be legal"""
+    rng = rng or np.random.default_rng()
+    moves_of = engine(size).moves
+    boards = np.zeros((games, size, size), np.uint8)
+    spawn_many(boards, rng)
+    scores = np.zeros(games, np.int64)
+    move_counts = np.zeros(games, np.int64)
+    playing = np.arange(games)
+    step = 0
+    while playing.size and (max_moves is None or step < max_moves):
+        step += 1
+        successors, move_scores, legal = moves_of(boards[playing])
+        going = legal.any(axis=1)
+        if not going.all():
+            playing, successors, move_scores, legal = (
+                playing[going], successors[going], move_scores[going], legal[going]
+            )
+            if not playing.size:
+                break
+
+        directions = policy(successors, move_scores, legal, rng)
+        index = np.arange(len(playing))
+        if not legal[index, directions].all():
+            raise ValueError('policy picked an illegal move')
+
+        boards[playing] = successors[index, directions]
+        scores[playing] += move_scores[index, directions]
+        move_counts[playing] += 1
+        spawn_many(boards, rng, playing)
+
+    return scores, move_counts, 1 << boards.reshape(games, -1).max(axis=1).astype(np.int64)
+
+
+def pack(boards: np.ndarray) -> np.ndarray:
+    """One key per board, 4 bits per cell in a uint64 when they fit or the board's bytes otherwise"""
+    flat = np.ascontiguousarray(boards, dtype=np.uint8).reshape(len(boards), -1)
+    if flat.shape[1] <= 16 and flat.max(initial=0) < 16:
+        return (flat.astype(np.uint64) << (np.arange(flat.shape[1], dtype=np.uint64) * 4)).sum(axis=1)
+    return flat.view(np.dtype((np.void, flat.shape[1]))).ravel()
+
+
+# Powers of every tile exponent row_heuristic could see
+_SUM_POWERS = np.arange(256)**3.5
+_MONOTONICITY_POWERS = np.arange(256)**4.0
+
+
+def row_heuristic(rows: np.ndarray) -> np.ndarray:
+    """How promising rows of tile exponents are, rewarding empty cells, possible merges and monotonic
+    rows while penalizing big tiles that are still around
+
+    Weights are the ones from nneonneo's 2048 AI, tuned for 4x4 boards"""
+    # Positions first, so everything works on whole columns instead of tiny rows
+    rows = np.ascontiguousarray(rows.T, dtype=np.intp)
+    empty = (rows == 0).sum(axis=0)
+    total = _SUM_POWERS[rows].sum(axis=0)
+
+    # Runs of k equal tiles count k times
+    equal = (rows[1:] == rows[:-1]) & (rows[1:] != 0)
+    merges = equal.sum(axis=0) + (equal[1:] & ~equal[:-1]).sum(axis=0) + equal[0]
+
+    powers = _MONOTONICITY_POWERS[rows]
+    steps = powers[1:] - powers[:-1]
+    monotonicity = np.minimum(np.clip(steps, 0, None).sum(axis=0), np.clip(-steps, 0, None).sum(axis=0))
+    return 200_000 + 270 * empty + 700 * merges - 47 * monotonicity - 11 * total
+
+
+class OutOfTime(Exception):
+    """A search went past its deadline"""
+
+
+class Searcher:
+    """Depth limited expectimax for boards of one size, deepening until its time runs out
+
+    Boards are expanded with Engine.moves a chunk at a time, checking the deadline between
+    chunks. Boards reached more than once in a chunk are only searched once, and the value of
+    every searched board is kept in a transposition table keyed by its size, packed bits and
+    depth, which can be shared between searchers of every size"""
+    def __init__(self, size: int, table: Optional[LRUCache] = None):
+        self.engine = engine(size)
+        self.table = LRUCache(SEARCH_TABLE_SIZE) if table is None else table
+        # Boards get two children per empty cell, chunks keep that to a few thousand
+        self.chunk_size = max(1, 4096 // size**2)
+        self.row_values = None
+        if self.engine.table is not None:
+            every_row = np.indices((self.engine.alphabet,) * size).reshape(size, -1).T[:, ::-1]
+            self.row_values = row_heuristic(every_row)
+
+    def heuristic(self, boards: np.ndarray) -> np.ndarray:
+        """Rows and columns of each board rated with row_heuristic and summed"""
+        lines = boards.reshape(len(boards), -1)[:, self.engine.lines[[LEFT, UP]]]
+        lines = lines.reshape(-1, self.engine.size)
+        if self.row_values is not None and lines.max(initial=0) < self.engine.alphabet:
+            values = self.row_values[lines.astype(np.int64) @ self.engine.powers]
+        else:
+            values = row_heuristic(lines)
+        return values.reshape(len(boards), -1).sum(axis=1)
+
+    def _max_values(self, boards: np.ndarray, deadline: float, depth: int) -> np.ndarray:
+        """Value of boards where it's the player's turn, searching depth moves ahead"""
+        if depth == 0:
+            return self.heuristic(boards)
+
+        keys, first, inverse = np.unique(pack(boards), return_index=True, return_inverse=True)
+        keys = keys.tolist()
+        values = np.empty(len(keys))
+        missing = []
+        size = self.engine.size
+        for index, key in enumerate(keys):
+            value = self.table.get((size, key, depth))
+            if value is None:
+                missing.append(index)
+            else:
+                values[index] = value
+
+        if missing:
+            missing = np.array(missing)
+            values[missing] = self._expand(boards[first[missing]], deadline, depth)
+            for index in missing.tolist():
+                self.table[size, keys[index], depth] = values[index]
+
+        return values[inverse.ravel()]
+
+    def _expand(self, boards: np.ndarray, deadline: float, depth: int) -> np.ndarray:
+        successors, _, legal = self.engine.moves(boards)
+        values = np.zeros(legal.shape)  # Lost boards are worth nothing
+        board_index, directions = np.nonzero(legal)
+        if board_index.size:
+            chances = successors[board_index, directions]
+            values[board_index, directions] = self._chance_values(chances, deadline, depth - 1)
+        return values.max(axis=1)
+
+    def _chance_values(self, boards: np.ndarray, deadline: float, depth: int) -> np.ndarray:
+        """Value of boards about to get a tile spawned, averaged over every spawn
+
+        Boards are searched a chunk at a time, giving up once past the deadline"""
+        values = []
+        for start in range(0, len(boards), self.chunk_size):
+            if time.perf_counter() > deadline:
+                raise OutOfTime
+            values.append(self._spawn_values(boards[start:start + self.chunk_size], deadline, depth))
+        return np.concatenate(values) if values else np.zeros(0)
+
+    def _spawn_values(self, boards: np.ndarray, deadline: float, depth: int) -> np.ndarray:
+        flat = boards.reshape(len(boards), -1)
+        board_index, cells = np.nonzero(flat == 0)
+        children = np.repeat(flat[board_index], 2, axis=0)
+        children[0::2][np.arange(len(cells)), cells] = 1
+        children[1::2][np.arange(len(cells)), cells] = 2
+        values = self._max_values(children.reshape(-1, *boards.shape[1:]), deadline, depth)
+        values = values.reshape(-1, 2) @ [10 / 11, 1 / 11]
+        return np.bincount(board_index, values, len(boards)) / np.bincount(board_index, minlength=len(boards))
+
+    def best_move(self, board: np.ndarray, time_budget: float = 0.15) -> Optional[Tuple[int, int]]:
+        """The best direction for a board and how many moves ahead the search got, None if it's lost
+
+        Searching one move ahead always finishes, deeper searches only count if they finish in time"""
+        successors, _, legal = self.engine.moves(board)
+        directions = np.flatnonzero(legal)
+        if not directions.size:
+            return None
+
+        best = None
+        deadline = time.perf_counter() + time_budget
+        for depth in itertools.count(1):
+            values = np.full(4, -np.inf)
+            try:
+                values[directions] = self._chance_values(
+                    successors[directions], math.inf if depth == 1 else deadline, depth - 1
+                )
+
+            except OutOfTime:
+                break
+
+            best = int(values.argmax()), depth
+            if depth >= 2 * len(board)**2:  # Deep enough to see the end of any small board
+                break
+
+        return best
+
+
+_search_table = LRUCache(SEARCH_TABLE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def searcher(size: int) -> Searcher:
+    """Searchers are kept once per size, all sharing one transposition table"""
+    return Searcher(size, _search_table)
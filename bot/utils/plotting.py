@@ -0,0 +1,92 @@
+import io
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+SIZE = (640, 400)
+BACKGROUND = (0x2f, 0x31, 0x36)
+AXES = (0x80, 0x80, 0x88)
+LINE = (0x50, 0x50, 0xfa)
+# Heatmap gradient stops, from the lowest value to the highest
+GRADIENT = np.array([(0x20, 0x20, 0x60), (0x50, 0x50, 0xfa), (0x50, 0xfa, 0x50), (0xfa, 0xfa, 0x60)])
+
+
+def auto_range(values: np.ndarray) -> Tuple[float, float]:
+    """Range covering most finite values, so asymptotes don't flatten everything else"""
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return -1.0, 1.0
+
+    low, high = np.percentile(finite, [1, 99])
+    if low == high:
+        return low - 1, high + 1
+
+    padding = (high - low) * 0.05
+    return low - padding, high + padding
+
+
+def _scale(values: np.ndarray, bounds: Tuple[float, float], pixels: int) -> np.ndarray:
+    return (values - bounds[0]) / (bounds[1] - bounds[0]) * (pixels - 1)
+
+
+def _axes(draw: ImageDraw.ImageDraw, x_range: Tuple[float, float], y_range: Tuple[float, float]):
+    width, height = SIZE
+    if x_range[0] <= 0 <= x_range[1]:
+        column = _scale(np.float64(0), x_range, width)
+        draw.line([(column, 0), (column, height)], fill=AXES)
+    if y_range[0] <= 0 <= y_range[1]:
+        row = height - 1 - _scale(np.float64(0), y_range, height)
+        draw.line([(0, row), (width, row)], fill=AXES)
+
+
+def _png(image: Image.Image) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def curve(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Optional[Tuple[float, float]] = None
+) -> Tuple[bytes, Tuple[float, float]]:
+    """Draw y over x as a line, returning the PNG and the y range it ended up using
+
+    The line breaks wherever the function isn't finite or jumps across the whole image"""
+    width, height = SIZE
+    y_range = y_range or auto_range(ys)
+    image = Image.new('RGB', SIZE, BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    _axes(draw, x_range, y_range)
+
+    columns = _scale(xs, x_range, width)
+    # Clamp far off points so Pillow always gets sane coordinates
+    rows = np.clip(height - 1 - _scale(ys, y_range, height), -height, 2 * height)
+    valid = np.isfinite(rows)
+    connected = valid[:-1] & valid[1:] & (np.abs(np.diff(rows)) < height * 2)
+    points = np.column_stack((columns, rows))
+    # Each run of connected points is drawn with a single line call
+    for segment in np.split(np.arange(len(xs)), np.flatnonzero(~connected) + 1):
+        segment = segment[valid[segment]]
+        if len(segment) > 1:
+            draw.line(points[segment].ravel().tolist(), fill=LINE, width=2, joint='curve')
+        elif len(segment) == 1:
+            draw.point(tuple(points[segment[0]]), fill=LINE)
+
+    return _png(image), y_range
+
+
+def heatmap(
+    values: np.ndarray, x_range: Tuple[float, float], y_range: Tuple[float, float]
+) -> Tuple[bytes, Tuple[float, float]]:
+    """Draw a grid of values, row 0 being the lowest y, returning the PNG and the value range used"""
+    z_range = auto_range(values)
+    positions = np.clip((values - z_range[0]) / (z_range[1] - z_range[0]), 0, 1) * (len(GRADIENT) - 1)
+    stops = np.arange(len(GRADIENT))
+    pixels = np.stack([np.interp(positions, stops, GRADIENT[:, channel]) for channel in range(3)], axis=-1)
+    pixels[~np.isfinite(values)] = BACKGROUND
+    image = Image.fromarray(np.flipud(pixels).astype(np.uint8), 'RGB')
+    _axes(ImageDraw.Draw(image), x_range, y_range)
+    return _png(image), z_range
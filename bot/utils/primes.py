@@ -0,0 +1,236 @@
+import math
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# Testing against every one of these bases is deterministic below MILLER_RABIN_LIMIT
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MILLER_RABIN_LIMIT = 3_317_044_064_679_887_385_961_981
+MAX_BITS = 4096
+SEGMENT_SIZE = 1 << 21
+BIT_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+class Sieve:
+    """Sieve of Eratosthenes over odd numbers, packed one bit each, that grows on demand
+
+    Bit i stands for 2i + 1. Growing only sieves the new numbers a segment at a time, crossing
+    them off with the primes that are already known, so nothing gets sieved twice"""
+    def __init__(self, limit: int = 1 << 16, max_limit: int = 1 << 27):
+        self.max_limit = max_limit
+        self._lock = threading.Lock()
+        flags = np.ones(limit // 2, dtype=bool)
+        flags[0] = False  # 1 isn't prime
+        for i in range(1, (math.isqrt(limit) - 1) // 2 + 1):
+            if flags[i]:
+                prime = 2 * i + 1
+                flags[prime * prime // 2::prime] = False
+
+        self.bits = bytearray(np.packbits(flags, bitorder='little').tobytes())
+        self.limit = limit
+
+    def extend(self, n: int):
+        """Sieve every number below n, growing at least twofold so extending stays rare"""
+        if n <= self.limit:
+            return
+        if n > self.max_limit:
+            raise ValueError(f'the prime sieve only goes up to {self.max_limit}')
+
+        with self._lock:
+            if n <= self.limit:
+                return
+
+            # Stay a multiple of 16 so every byte of bits is whole
+            high = -(-min(max(n, self.limit * 2), self.max_limit) // 16) * 16
+            base = self.primes(math.isqrt(high))[1:].tolist()
+            for start in range(self.limit, high, SEGMENT_SIZE):
+                end = min(start + SEGMENT_SIZE, high)
+                flags = np.ones((end - start) // 2, dtype=bool)
+                for prime in base:
+                    if prime * prime >= end:
+                        break
+                    # First odd multiple in the segment
+                    multiple = max(prime * prime, -(-start // prime) * prime)
+                    if not multiple % 2:
+                        multiple += prime
+                    flags[(multiple - start) // 2::prime] = False
+
+                self.bits += np.packbits(flags, bitorder='little').tobytes()
+
+            self.limit = high
+
+    def __contains__(self, n: int) -> bool:
+        if n < 3 or not n % 2:
+            return n == 2
+        return bool(self.bits[n >> 4] >> (n >> 1 & 7) & 1)
+
+    def primes(self, n: int) -> np.ndarray:
+        """Every prime up to n, which has to be below limit"""
+        if n < 2:
+            return np.array([], dtype=np.int64)
+
+        odd = (n + 1) // 2
+        # Copied out so the bytearray isn't exported while another thread extends it
+        flags = np.unpackbits(np.frombuffer(bytes(self.bits[:-(-odd // 8)]), np.uint8), bitorder='little')
+        return np.concatenate(([2], np.flatnonzero(flags[:odd]) * 2 + 1))
+
+    def nth(self, index: int) -> Optional[int]:
+        """The index-th prime counting from 1, None if it's past limit"""
+        if index == 1:
+            return 2
+
+        index -= 1  # Bits only cover odd primes
+        chunk_size = 1 << 20
+        for offset in range(0, len(self.bits), chunk_size):
+            chunk = np.frombuffer(bytes(self.bits[offset:offset + chunk_size]), np.uint8)
+            counts = np.cumsum(BIT_COUNTS[chunk])
+            if index > counts[-1]:
+                index -= int(counts[-1])
+                continue
+
+            byte = int(np.searchsorted(counts, index))
+            index -= int(counts[byte - 1]) if byte else 0
+            bits = self.bits[offset + byte]
+            for bit in range(8):
+                index -= bits >> bit & 1
+                if not index:
+                    return 2 * ((offset + byte) * 8 + bit) + 1
+
+        return None
+
+
+sieve = Sieve()
+TRIAL_PRIMES = sieve.primes(1000).tolist()
+
+
+def _check_size(n: int):
+    if n.bit_length() > MAX_BITS:
+        raise ValueError(f'number is too big, the limit is {MAX_BITS} bits')
+
+
+def _miller_rabin(n: int) -> bool:
+    d, shift = n - 1, 0
+    while not d % 2:
+        d, shift = d // 2, shift + 1
+
+    bases = list(SMALL_PRIMES)
+    if n >= MILLER_RABIN_LIMIT:  # Not deterministic anymore, add some random bases on top
+        bases += [random.randrange(2, n - 1) for _ in range(8)]
+
+    for base in bases:
+        x = pow(base, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(shift - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+
+    return True
+
+
+def is_prime(n: int) -> bool:
+    """Looked up in the sieve when it's small enough, Miller-Rabin otherwise"""
+    _check_size(n)
+    if n < sieve.limit:
+        return n in sieve
+    if n < 1 << 24:
+        sieve.extend(n + 1)
+        return n in sieve
+
+    for prime in SMALL_PRIMES:
+        if not n % prime:
+            return False
+    return _miller_rabin(n)
+
+
+def _pollard_rho(n: int, step: Optional[Callable[[int], None]] = None) -> int:
+    """A non trivial factor of the odd composite n, with Brent's cycle finding"""
+    batch = 128
+    while True:
+        y, c = random.randrange(1, n), random.randrange(1, n)
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+
+            k = 0
+            while k < r and g == 1:
+                saved = y
+                for _ in range(min(batch, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+
+                g = math.gcd(q, n)
+                k += batch
+                if step:
+                    step(batch)
+
+            r *= 2
+
+        if g == n:  # Overshot inside the last batch, redo it one step at a time
+            g = 1
+            while g == 1:
+                saved = (saved * saved + c) % n
+                g = math.gcd(abs(x - saved), n)
+
+        if g != n:
+            return g
+
+
+def factorize(n: int, step: Optional[Callable[[int], None]] = None) -> Dict[int, int]:
+    """Prime factors of n as {prime: exponent}, step gets called with the work done by Pollard rho"""
+    _check_size(n)
+    if n < 1:
+        raise ValueError('only positive numbers can be factored')
+
+    factors = {}
+    for prime in TRIAL_PRIMES:
+        if prime * prime > n:
+            break
+        while not n % prime:
+            factors[prime] = factors.get(prime, 0) + 1
+            n //= prime
+
+    remaining = [n] if n > 1 else []
+    while remaining:
+        n = remaining.pop()
+        if is_prime(n):
+            factors[n] = factors.get(n, 0) + 1
+        else:
+            divisor = _pollard_rho(n, step)
+            remaining += [divisor, n // divisor]
+
+    return dict(sorted(factors.items()))
+
+
+def totient(n: int, step: Optional[Callable[[int], None]] = None) -> int:
+    for prime in factorize(n, step):
+        n = n // prime * (prime - 1)
+    return n
+
+
+def modpow(base: int, exponent: int, modulus: int) -> int:
+    for n in (base, exponent, modulus):
+        _check_size(n)
+    return pow(base, exponent, modulus)
+
+
+def primes_up_to(n: int) -> np.ndarray:
+    sieve.extend(n + 1)
+    return sieve.primes(n)
+
+
+def nth_prime(index: int) -> int:
+    if index < 1:
+        raise ValueError('primes are counted from 1')
+
+    # Rosser's bound, the index-th prime is below index * (ln index + ln ln index) from 6 on
+    bound = 15 if index < 6 else int(index * (math.log(index) + math.log(math.log(index)))) + 1
+    sieve.extend(bound + 1)
+    return sieve.nth(index)
@@ -0,0 +1,107 @@
+import asyncio
+import collections
+from typing import Union
+
+import discord
+
+from bot.utils.cache import LRUCache
+
+Emoji = Union[discord.Emoji, discord.PartialEmoji, discord.Reaction, str, None]
+
+
+class _Removal:
+    """Someone's reaction to take off a message, queued along with the ones to add"""
+    __slots__ = ('emoji', 'member')
+
+    def __init__(self, emoji: Emoji, member: discord.abc.Snowflake):
+        self.emoji = emoji
+        self.member = member
+
+
+class ReactionDispatcher:
+    """Adds reactions for everyone through one queue per message
+
+    Each message's reactions go out in the order they were queued, one after the other, since
+    they share a rate limit bucket anyway and discord.py waits on it for us, while reactions on
+    different messages go out at the same time. Reactions the bot already added to a message, or
+    that are queued twice, are skipped, and None is skipped so missing custom emojis can be passed
+    straight through. Other people's reactions can be removed through the same queue
+
+    What got added is remembered per message rather than read off the message, since messages
+    from send() never get their reactions updated. The least recently reacted to messages are
+    forgotten past max_messages, or right away with forget"""
+    def __init__(self, max_messages: int = 1024):
+        self.queues = {}
+        self.reacted = LRUCache(max_messages)
+        self.added = 0
+        self.skipped = 0
+
+    def add(self, message: discord.Message, *emojis: Emoji) -> asyncio.Future:
+        """Queue reactions for a message, the future is done once they've all been added or skipped"""
+        done = asyncio.get_event_loop().create_future()
+        if message.id not in self.queues:
+            self.queues[message.id] = collections.deque()
+            asyncio.ensure_future(self._worker(message, self.queues[message.id]))
+
+        self.queues[message.id] += (*emojis, done)
+        return done
+
+    def remove(self, message: discord.Message, emoji: Emoji, member: discord.abc.Snowflake) -> asyncio.Future:
+        """Queue removing someone's reaction, failing to is ignored"""
+        return self.add(message, _Removal(emoji, member))
+
+    def forget(self, message_id: int):
+        """Drop what's been added to a message, once it's gone or done with"""
+        self.reacted.pop(message_id)
+
+    @staticmethod
+    def has_reaction(message: discord.Message, emoji: str) -> bool:
+        return any(reaction.me and str(reaction.emoji) == emoji for reaction in message.reactions)
+
+    async def _worker(self, message: discord.Message, queue: collections.deque):
+        failed = False  # The message is gone or can't be reacted to, drain what's left
+        try:
+            while queue:
+                emoji = queue.popleft()
+                if isinstance(emoji, asyncio.Future):
+                    if not emoji.done():
+                        emoji.set_result(None)
+                    continue
+
+                if isinstance(emoji, _Removal):
+                    if not failed:
+                        try:
+                            await message.remove_reaction(emoji.emoji, emoji.member)
+
+                        except discord.HTTPException:  # Removed already, or missing permissions
+                            pass
+                    continue
+
+                reacted = self.reacted.get(message.id)
+                if reacted is None:
+                    reacted = self.reacted[message.id] = set()
+                if emoji is None or failed or str(emoji) in reacted or self.has_reaction(message, str(emoji)):
+                    self.skipped += 1
+                    continue
+
+                try:
+                    await message.add_reaction(emoji)
+
+                except (discord.NotFound, discord.Forbidden):
+                    failed = True
+
+                except discord.InvalidArgument:  # Unknown emoji, no use trying it again
+                    reacted.add(str(emoji))
+
+                except discord.HTTPException:
+                    pass
+
+                else:
+                    self.added += 1
+                    reacted.add(str(emoji))
+
+        finally:
+            del self.queues[message.id]
+            for item in queue:
+                if isinstance(item, asyncio.Future) and not item.done():
+                    item.set_result(None)
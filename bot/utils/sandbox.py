@@ -0,0 +1,146 @@
+import asyncio
+import math
+import multiprocessing
+import multiprocessing.connection
+import resource
+import signal
+from typing import Any, Callable, Optional
+
+import psutil
+
+
+class SandboxError(Exception):
+    """A job couldn't be finished by a sandbox worker"""
+
+
+class SandboxTimeout(SandboxError):
+    """A job went past its time limit and its worker got killed"""
+
+
+def _worker_main(conn: multiprocessing.connection.Connection, memory_limit: Optional[int]):
+    """Worker process loop, runs (func, args, kwargs, cpu_time) jobs until the pipe closes"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit:
+        # Linux doesn't enforce RLIMIT_RSS, so cap the address space on top of what was inherited
+        limit = psutil.Process().memory_info().vms + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    _, cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    while True:
+        try:
+            func, args, kwargs, cpu_time = conn.recv()
+
+        except (EOFError, OSError):
+            return
+
+        # The cpu limit counts the whole process, so move it forward for every job, SIGXCPU kills us
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_limit = math.ceil(usage.ru_utime + usage.ru_stime + cpu_time)
+        if cpu_hard_limit != resource.RLIM_INFINITY:
+            cpu_limit = min(cpu_limit, cpu_hard_limit)
+
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_hard_limit))
+        try:
+            result = (True, func(*args, **kwargs))
+
+        except MemoryError:
+            result = (False, SandboxError('Ran out of memory'))
+
+        except Exception as exc:
+            result = (False, exc)
+
+        try:
+            conn.send(result)
+
+        except Exception as exc:
+            conn.send((False, SandboxError(f"Couldn't send result back: {exc!r}")))
+
+
+class _Worker:
+    def __init__(self, context: multiprocessing.context.BaseContext, memory_limit: Optional[int]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Sandbox:
+    """Pool of pre-forked worker processes for CPU heavy jobs running untrusted input
+
+    Jobs run outside the bot's process so they don't hold its GIL, every job gets a wall clock
+    timeout and a matching cpu time rlimit, and workers have their address space capped. A worker
+    that times out, gets cancelled or dies is killed and replaced with a fresh one"""
+    def __init__(self, workers: int = 2, timeout: float = 10, memory_limit: Optional[int] = 256):
+        self.timeout = timeout
+        self.memory_limit = memory_limit * 1024**2 if memory_limit else None
+        # Forking keeps the bot's modules around, spawning would re-run bot/__main__.py
+        self._context = multiprocessing.get_context('fork')
+        self._idle = asyncio.Queue()
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put_nowait(_Worker(self._context, self.memory_limit))
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a picklable callable on a worker, raising SandboxError if it couldn't finish"""
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        worker = await self._idle.get()
+        try:
+            if not worker.process.is_alive():
+                worker.kill()
+                worker = _Worker(self._context, self.memory_limit)
+
+            worker.conn.send((func, args, kwargs, timeout))
+            readable = loop.create_future()
+            loop.add_reader(
+                worker.conn.fileno(), lambda: readable.done() or readable.set_result(None)
+            )
+            try:
+                await asyncio.wait_for(readable, timeout)
+
+            finally:
+                loop.remove_reader(worker.conn.fileno())
+
+            success, value = worker.conn.recv()
+
+        except asyncio.TimeoutError:
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit)
+            raise SandboxTimeout(f'Timed out after {timeout:g}s') from None
+
+        except asyncio.CancelledError:
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit)
+            raise
+
+        except (EOFError, OSError):
+            worker.process.join(1)
+            exitcode = worker.process.exitcode
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit)
+            if exitcode == -signal.SIGXCPU:
+                raise SandboxTimeout(f'Went past {math.ceil(timeout)}s of cpu time') from None
+
+            raise SandboxError(f'Worker died (exit code {exitcode})') from None
+
+        finally:
+            if self._closed:
+                worker.kill()
+            else:
+                self._idle.put_nowait(worker)
+
+        if not success:
+            raise value
+
+        return value
+
+    def close(self):
+        """Kill every idle worker, busy ones get killed once their job is done"""
+        self._closed = True
+        while not self._idle.empty():
+            self._idle.get_nowait().kill()
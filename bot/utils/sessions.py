@@ -0,0 +1,200 @@
+import asyncio
+import collections
+import itertools
+import numbers
+import pickle
+import sys
+import time
+import types
+import zlib
+from typing import Any, Hashable, Iterable, Optional
+
+import numpy as np
+
+from bot.utils.formatting import filesize
+
+
+def _referents(value: Any) -> Iterable:
+    """What an object that isn't a container keeps alive, its attributes or its closure"""
+    if isinstance(value, types.FunctionType):
+        for cell in value.__closure__ or ():
+            try:
+                yield cell.cell_contents
+
+            except ValueError:  # Not assigned yet
+                pass
+        return
+
+    if isinstance(value, collections.ChainMap):  # Function arguments layered over an environment
+        yield from value.maps
+        return
+
+    yield from getattr(value, '__dict__', {}).values()
+    for cls in type(value).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(value, name):
+                yield getattr(value, name)
+
+
+def footprint(value: Any, depth: int = 0, seen: Optional[set] = None) -> int:
+    """Rough size of a value in bytes, counting what containers, objects and closures hold a couple
+    levels deep
+
+    Objects whose id is in seen count as nothing, and everything counted gets added to it, so
+    sharing seen between values counts what they share once. Big containers are estimated from
+    their first items instead of going through all of them"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+
+    size = sys.getsizeof(value)
+    if depth >= 3 or isinstance(value, (str, bytes, numbers.Number, type, types.ModuleType)):
+        return size
+
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        if value:
+            sample = itertools.islice(value.items() if isinstance(value, dict) else value, 256)
+            if isinstance(value, dict):
+                sample = itertools.chain.from_iterable(sample)
+            sampled = sum(footprint(i, depth + 1, seen) for i in sample)
+            size += sampled * len(value) // min(len(value), 256)
+    else:
+        size += sum(footprint(i, depth + 1, seen) for i in _referents(value))
+
+    return size
+
+
+class Spilled:
+    """A value kept pickled and compressed until it gets looked up again"""
+    __slots__ = ('data', 'original_size')
+
+    def __init__(self, value: Any, original_size: int):
+        self.data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self.original_size = original_size
+
+    def load(self) -> Any:
+        return pickle.loads(zlib.decompress(self.data))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self):
+        return f'<spilled, {filesize(self.original_size)} packed into {filesize(len(self))}>'
+
+
+class SessionEnv(dict):
+    """Session variables, spilled ones get loaded back the first time they're looked up
+
+    Loaded values are kept until settle so a loop reading a spilled variable only loads it once"""
+    def __init__(self):
+        super().__init__()
+        self.loaded = {}
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = super().__getitem__(key)
+        if value.__class__ is not Spilled:
+            return value
+
+        if key not in self.loaded:
+            self.loaded[key] = value.load()
+        return self.loaded[key]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self[key]
+
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.loaded.pop(key, None)
+        super().__setitem__(key, value)
+
+
+class Session:
+    """Variables someone kept between evaluations, with how much memory they take"""
+    def __init__(self):
+        self.env = SessionEnv()
+        self.lock = asyncio.Lock()
+        self.created = self.last_used = time.monotonic()
+        self.size = 0
+
+    def settle(self, spill_size: int):
+        """Spill big values that pickle smaller than they are, then measure the session again
+
+        Runs after every evaluation, values that got loaded back are dropped again here"""
+        self.env.loaded.clear()
+        self.size = 0
+        seen = {id(self.env)}  # Functions refer back to the session, and values can be shared
+        for name, value in dict.items(self.env):
+            if value.__class__ is Spilled:
+                self.size += len(value)
+                continue
+
+            size = footprint(value, seen=seen)
+            if size > spill_size:
+                try:
+                    spilled = Spilled(value, size)
+
+                except Exception:  # Unpicklable, functions for example
+                    spilled = None
+
+                if spilled is not None and len(spilled) < size:
+                    dict.__setitem__(self.env, name, spilled)
+                    size = len(spilled)
+
+            self.size += size
+
+
+class SessionStore:
+    """Sessions by key, least recently used ones get evicted once there are too many or they take
+    too much memory together, and idle ones expire after ttl seconds
+
+    Sessions that are in use are never evicted"""
+    def __init__(
+        self, max_sessions: int = 256, max_memory: int = 64, ttl: float = 3600, spill_size: int = 64
+    ):
+        self.max_sessions = max_sessions
+        self.max_memory = max_memory * 1024**2
+        self.ttl = ttl
+        self.spill_size = spill_size * 1024
+        self.sessions = collections.OrderedDict()
+
+    @property
+    def memory(self) -> int:
+        return sum(i.size for i in self.sessions.values())
+
+    def get(self, key: Hashable) -> Session:
+        """Session for key, made if there's none yet"""
+        self.expire()
+        session = self.sessions.pop(key, None) or Session()
+        session.last_used = time.monotonic()
+        self.sessions[key] = session
+        return session
+
+    def pop(self, key: Hashable) -> Optional[Session]:
+        return self.sessions.pop(key, None)
+
+    def expire(self):
+        now = time.monotonic()
+        for key, session in list(self.sessions.items()):
+            if now - session.last_used > self.ttl and not session.lock.locked():
+                del self.sessions[key]
+
+    def trim(self):
+        """Evict least recently used sessions until both limits are met"""
+        self.expire()
+        memory = self.memory
+        for key, session in list(self.sessions.items()):
+            if len(self.sessions) <= self.max_sessions and memory <= self.max_memory:
+                break
+            if not session.lock.locked():
+                memory -= session.size
+                del self.sessions[key]
+
+    def __len__(self) -> int:
+        return len(self.sessions)
@@ -0,0 +1,59 @@
+import math
+import time
+from typing import Hashable, List
+
+
+class TimerWheel:
+    """Deadlines for any number of keys, all checked by a single periodic tick
+
+    Keys go in the slot of the tick their deadline falls on, so a tick only looks at what's due
+    around then instead of every key. Cancelling just forgets the deadline, stale slot entries get
+    dropped once their tick comes, and deadlines past the wheel's reach wait in its last slot to be
+    put back further along"""
+    def __init__(self, slots: int = 128, resolution: float = 1.0):
+        self.slots = [set() for _ in range(slots)]
+        self.resolution = resolution
+        self.deadlines = {}
+        self.tick = int(time.monotonic() / resolution)
+
+    def _place(self, key: Hashable, deadline: float):
+        tick = min(max(math.ceil(deadline / self.resolution), self.tick + 1), self.tick + len(self.slots) - 1)
+        self.slots[tick % len(self.slots)].add(key)
+
+    def schedule(self, key: Hashable, delay: float):
+        """Set or reset key's deadline to delay seconds from now"""
+        self.deadlines[key] = time.monotonic() + delay
+        self._place(key, self.deadlines[key])
+
+    def cancel(self, key: Hashable):
+        self.deadlines.pop(key, None)
+
+    def expired(self) -> List[Hashable]:
+        """Advance to now, returning the keys whose deadline passed, which are forgotten"""
+        now = time.monotonic()
+        current = int(now / self.resolution)
+        expired = []
+        # A late tick still goes around the wheel only once
+        for tick in range(max(self.tick + 1, current - len(self.slots) + 1), current + 1):
+            self.tick = tick
+            slot = self.slots[tick % len(self.slots)]
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                deadline = self.deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline <= now:
+                    del self.deadlines[key]
+                    expired.append(key)
+                else:
+                    self._place(key, deadline)
+
+        self.tick = max(self.tick, current)
+        return expired
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.deadlines
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
@@ -0,0 +1,40 @@
+import re
+from typing import Dict, List
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+class TriggerMatcher:
+    """Every reaction trigger compiled into a single regex, built once per config
+
+    Triggers match as whole words after punctuation is stripped, ignoring case, and their last
+    character or group can repeat. Each reaction's triggers sit in a lookahead of their own that's
+    tried at every word start, so one pass over a message finds every reaction, even ones whose
+    triggers match the same word"""
+    def __init__(self, reactions: Dict[str, List[str]]):
+        self.reactions = [reaction for reaction, triggers in reactions.items() if triggers]
+        self.any = self.pattern = None
+        if self.reactions:
+            alternatives = ['|'.join(f'(?:{i}+)' for i in reactions[reaction]) for reaction in self.reactions]
+            # Most messages trigger nothing, which a plain alternation tells quicker than the lookaheads
+            self.any = re.compile(f'(?<!\\S)(?:{"|".join(alternatives)})(?!\\S)', flags=re.IGNORECASE)
+            lookaheads = ''.join(f'(?:(?=(?P<r{i}>{j})(?!\\S)))?' for i, j in enumerate(alternatives))
+            self.pattern = re.compile(f'(?<!\\S){lookaheads}', flags=re.IGNORECASE)
+            # Triggers can have groups of their own, so look up which columns are the reactions'
+            self.columns = [self.pattern.groupindex[f'r{i}'] - 1 for i in range(len(self.reactions))]
+
+    def match(self, content: str) -> List[str]:
+        """Reactions triggered by a message, in the order they're configured"""
+        if self.pattern is None:
+            return []
+
+        content = PUNCTUATION.sub('', content)
+        if not self.any.search(content):
+            return []
+
+        matches = self.pattern.findall(content)
+        if self.pattern.groups == 1:  # findall gives plain strings when there's a single group
+            matches = [(i,) for i in matches]
+
+        columns = list(zip(*matches))
+        return [reaction for reaction, column in zip(self.reactions, self.columns) if any(columns[column])]